@@ -0,0 +1,40 @@
+# Общий цикл asyncio для долгих запросов к GigaChat
+# Обработчики telebot только ставят корутину в цикл и сразу
+# освобождают поток, а сотни генераций ждут ответа одновременно
+# на одном цикле событий. Блокирующие вызовы Bot API из корутин
+# выполняются в пуле потоков через run_sync
+import asyncio  # Цикл событий
+import functools  # Передача именованных аргументов в пул потоков
+import threading  # Поток, в котором крутится цикл
+
+_loop = None  # Цикл событий
+_lock = threading.Lock()  # Защищает создание цикла
+
+
+def get_loop():
+    """Цикл событий (запускается в отдельном потоке при первом обращении)"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='asyncio', daemon=True).start()
+        return _loop
+
+
+def submit(coro):
+    """Запуск корутины из любого потока, возвращает concurrent.futures.Future"""
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    future.add_done_callback(_report_error)
+    return future
+
+
+def _report_error(future):
+    """Печать необработанной ошибки корутины"""
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Ошибка фоновой задачи: {future.exception()!r}")
+
+
+async def run_sync(func, *args, **kwargs):
+    """Выполнение блокирующей функции (вызова Bot API) в пуле потоков"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,250 @@
+# Нагрузочная проверка сценария "Изучить тему" без сети и без квоты GigaChat
+# N учеников одновременно проходят весь путь: "Изучить тему" -> тема ->
+# теория -> "Пройти тест" -> ответы на вопросы -> результат. Бот собран из
+# тех же модулей, что main.py (очередь outbox, полосы чатов, очередь
+# генераций, кэш и банк материалов), Bot API заменён fake_telegram, а
+# GigaChat - fake_gigachat (или любым адресом из --gigachat-url).
+# Все файлы бота (кэш, банк, пользователи) создаются во временном каталоге.
+#
+#     python bench_learn.py --users 50 --topics 10 --latency 2 --error-rate 0.05
+#
+# Выводит p50/p95/p99 задержек по шагам и пропускную способность
+import argparse  # Параметры командной строки
+import itertools  # Идентификаторы обновлений
+import json  # Клавиатуры вопросов
+import math  # Процентили
+import os  # Рабочий каталог
+import random  # Выбор ответов
+import sys  # Путь к модулям бота
+import tempfile  # Временный рабочий каталог
+import threading  # Ученики и ожидание ответов бота
+import time  # Замер задержек
+from collections import defaultdict  # Сообщения по чатам
+from concurrent.futures import ThreadPoolExecutor  # Одновременные ученики
+from http.server import ThreadingHTTPServer  # Заглушка Bot API
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import config  # Настройки бота (меняются под проверку до импорта learn)
+import fake_gigachat  # Заглушка GigaChat
+from fake_telegram import FakeBotApi, make_update  # Заглушка Bot API и обновления
+
+STATUS = ('📖', '⏳', '⚠️', '✍️')  # Служебные тексты вместо теории
+FAILURE = ('Ошибка', 'GigaChat не ответил')  # Генерация не удалась
+STEPS = ('topic_prompt', 'first_text', 'materials', 'first_question', 'answer', 'flow')
+_callback_ids = itertools.count(1)
+
+
+class Mailbox:
+    """Исходящие вызовы бота, разобранные по чатам"""
+
+    def __init__(self):
+        self.calls = defaultdict(list)  # {chat_id: [(метод, параметры)]}
+        self.cond = threading.Condition()
+
+    def record(self, method, params):
+        chat_id = params.get('chat_id')
+        if chat_id:
+            with self.cond:
+                self.calls[str(chat_id)].append((method, params))
+                self.cond.notify_all()
+
+    def wait(self, chat_id, cursor, predicate, timeout):
+        """Первый вызов после cursor, подходящий под predicate; (номер, параметры)"""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                calls = self.calls[str(chat_id)]
+                for index in range(cursor, len(calls)):
+                    method, params = calls[index]
+                    if predicate(method, params):
+                        return index + 1, params
+                    if params.get('text', '').startswith(FAILURE):
+                        raise RuntimeError(f"чат {chat_id}: {params['text']}")
+                cursor = len(calls)
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise TimeoutError(f'чат {chat_id}: нет ответа за {timeout} с')
+                self.cond.wait(left)
+
+
+mailbox = Mailbox()
+
+
+class RecordingBotApi(FakeBotApi):
+    """Заглушка Bot API, передающая исходящие вызовы ученикам"""
+
+    @staticmethod
+    def _result(method, params):
+        result = FakeBotApi._result(method, params)
+        if isinstance(result, dict) and 'message_id' in result:
+            params = dict(params, message_id=result['message_id'])
+        mailbox.record(method, params)
+        return result
+
+
+def text_of(prefix):
+    """Условие: отправленное сообщение, начинающееся с prefix"""
+    return lambda method, params: method == 'sendMessage' and params.get('text', '').startswith(prefix)
+
+
+def theory_shown(method, params):
+    """Условие: в чате появился текст теории (не заглушка и не служебный текст)"""
+    text = params.get('text', '')
+    return method in ('sendMessage', 'editMessageText') and text and not text.startswith(STATUS)
+
+
+def callback_update(user_id, message_id, text, data):
+    """Обновление с нажатием inline-кнопки"""
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'Ученик {user_id}'}
+    return {
+        'update_id': next(_callback_ids) + 10 ** 9,
+        'callback_query': {
+            'id': str(next(_callback_ids)),
+            'from': user,
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': message_id,
+                'chat': {'id': user_id, 'type': 'private'},
+                'date': int(time.time()),
+                'text': text
+            }
+        }
+    }
+
+
+def run_user(bot, types, user_id, topic, timeout):
+    """Путь одного ученика; возвращает {шаг: [задержки, с]}"""
+    timings = defaultdict(list)
+    feed = lambda update: bot.process_new_updates([types.Update.de_json(update)])
+    started = time.perf_counter()
+    cursor = len(mailbox.calls[str(user_id)])
+
+    feed(make_update('Изучить тему', user_id=user_id))
+    cursor, _ = mailbox.wait(user_id, cursor, text_of('📖 Введите тему'), timeout)
+    timings['topic_prompt'].append(time.perf_counter() - started)
+
+    sent = time.perf_counter()
+    feed(make_update(topic, user_id=user_id))
+    first, _ = mailbox.wait(user_id, cursor, theory_shown, timeout)
+    timings['first_text'].append(time.perf_counter() - sent)
+    cursor, _ = mailbox.wait(user_id, first - 1, text_of('📚 Материалы готовы'), timeout)
+    timings['materials'].append(time.perf_counter() - sent)
+
+    sent = time.perf_counter()
+    feed(make_update('Пройти тест', user_id=user_id))
+    cursor, question = mailbox.wait(user_id, cursor, text_of('📝 Вопрос'), timeout)
+    timings['first_question'].append(time.perf_counter() - sent)
+    while True:
+        buttons = [button for row in json.loads(question['reply_markup'])['inline_keyboard'] for button in row]
+        sent = time.perf_counter()
+        feed(callback_update(user_id, question['message_id'], question['text'],
+                             random.choice(buttons)['callback_data']))
+        cursor, reply = mailbox.wait(
+            user_id, cursor,
+            lambda method, params: text_of('📝 Вопрос')(method, params) or text_of('📊 Тест завершен')(method, params),
+            timeout
+        )
+        timings['answer'].append(time.perf_counter() - sent)
+        if reply['text'].startswith('📊'):
+            break
+        question = reply
+    timings['flow'].append(time.perf_counter() - started)
+    return timings
+
+
+def percentile(values, p):
+    """Процентиль по рангу"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def report(timings, elapsed, users, failures):
+    """Таблица задержек по шагам и пропускная способность"""
+    print(f"{'шаг':<16}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for step in STEPS:
+        values = timings.get(step)
+        if values:
+            print(f"{step:<16}{len(values):>6}" + ''.join(
+                f"{value:>9.3f}" for value in (percentile(values, 50), percentile(values, 95),
+                                              percentile(values, 99), max(values))))
+    done = len(timings.get('flow', []))
+    print(f"Пройдено {done} из {users} за {elapsed:.1f} с: {done / elapsed:.2f} сценариев/с, "
+          f"{len(timings.get('answer', [])) / elapsed:.1f} ответов на вопросы/с")
+    if failures:
+        print(f"Не пройдено: {len(failures)}, например: {failures[0]}")
+    print(f"Запросы к заглушке GigaChat: {fake_gigachat.FakeGigaChat.counters}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочная проверка сценария "Изучить тему"')
+    parser.add_argument('--users', type=int, default=20, help='учеников')
+    parser.add_argument('--topics', type=int, default=5, help='разных тем (ученики делят их по кругу)')
+    parser.add_argument('--ramp', type=float, default=0.0, help='за сколько секунд стартуют все ученики')
+    parser.add_argument('--timeout', type=float, default=180, help='ожидание одного ответа бота, с')
+    parser.add_argument('--latency', type=float, default=1.0, help='задержка первого куска GigaChat, с')
+    parser.add_argument('--jitter', type=float, default=0.5, help='случайная добавка к задержке, с')
+    parser.add_argument('--chunk-delay', type=float, default=0.02, help='пауза между кусками, с')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ошибок GigaChat (0..1)')
+    parser.add_argument('--gigachat-url', help='внешний GigaChat или заглушка вместо встроенной (base_url)')
+    parser.add_argument('--no-outbox', action='store_true', help='без ограничений частоты Telegram')
+    args = parser.parse_args()
+
+    # Временный каталог: кэш, банк материалов и пользователи проверки не
+    # смешиваются с рабочими файлами бота
+    os.chdir(tempfile.mkdtemp(prefix='bench_learn_'))
+    with open('gpt_api.txt', 'w') as f:
+        f.write('YmVuY2g6YmVuY2g=')  # Заглушке подходит любой ключ
+    fake_telegram = ThreadingHTTPServer(('127.0.0.1', 0), RecordingBotApi)
+    threading.Thread(target=fake_telegram.serve_forever, daemon=True).start()
+    if args.gigachat_url:
+        config.gigachat_base_url = args.gigachat_url
+    else:
+        gigachat = fake_gigachat.serve(port=0)
+        fake_gigachat.configure(latency=args.latency, jitter=args.jitter, chunk_delay=args.chunk_delay,
+                                error_rate=args.error_rate)
+        config.gigachat_base_url = f'http://127.0.0.1:{gigachat.server_port}/api/v1'
+        config.gigachat_auth_url = f'http://127.0.0.1:{gigachat.server_port}/api/v2/oauth'
+
+    # Бот из тех же частей, что main.py
+    import telebot
+    from telebot import types
+    import learn, llm_jobs, outbox, state, user_store
+    from scheduler import ChatOrderedTeleBot
+    from state import StateHandlerBackend
+    telebot.apihelper.API_URL = f'http://127.0.0.1:{fake_telegram.server_port}/bot{{0}}/{{1}}'
+    llm_jobs.WORKERS = config.llm_workers
+    llm_jobs.DEADLINE = config.llm_job_deadline
+    llm_jobs.RETRIES = config.llm_job_retries
+    llm_jobs.BACKOFF = config.llm_retry_backoff
+    state.init('memory')
+    bot = ChatOrderedTeleBot('0:bench', lanes=config.num_threads, lane_queue_size=config.lane_queue_size,
+                             next_step_backend=StateHandlerBackend())
+    learn.init_learning_module(bot)
+    if not args.no_outbox:
+        outbox.install(config.outbox_global_rate, config.outbox_chat_rate,
+                       config.outbox_chat_burst, config.outbox_workers)
+    user_store.init()
+    bot.message_handler(func=lambda message: message.text == 'Изучить тему')(learn.start_learning_session)
+    bot.callback_query_handler(func=lambda call: call.data.startswith('learntest_'))(learn.handle_test_answer)
+
+    topics = [f'Тема проверки {i + 1}' for i in range(args.topics)]
+    timings, failures = defaultdict(list), []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        futures = []
+        for i in range(args.users):
+            if args.ramp and i:
+                time.sleep(args.ramp / args.users)
+            futures.append(pool.submit(run_user, bot, types, 1000 + i, topics[i % len(topics)], args.timeout))
+        for future in futures:
+            try:
+                for step, values in future.result().items():
+                    timings[step].extend(values)
+            except Exception as e:
+                failures.append(repr(e))
+    report(timings, time.perf_counter() - started, args.users, failures)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,13 +7,15 @@ main_menu = {
     'btn6':'Игра в математику',
     'btn7':'Начать обучение',
     'btn8':'Начать тестирование',
-    'btn9':'Изучить тему'
+    'btn9':'Изучить тему',
+    'btn10':'Мой прогресс'
 }
 
 admin_menu = {
     'btn1':'Показать пользователей',
     'btn2':'Удалить всех пользователей',
-    'btn3':'Меню'
+    'btn3':'Состояние очередей',
+    'btn4':'Меню'
 }
 
 question_menu = {
@@ -31,3 +33,94 @@ lessons = {
     'Урок 4':'Урок 4',
     'Урок 5':'Урок 5'
 }
+
+# Хранилище пользователей: 'journal' - память + журнал, 'sqlite' - база SQLite
+user_backend = 'journal'
+# Файл базы SQLite (для user_backend = 'sqlite')
+user_db_file = 'user_data.db'
+# Количество потоков (полос) обработки обновлений. Чат всегда попадает
+# на одну полосу, данные пользователей изменяются в транзакциях user_store
+num_threads = 8
+# Сколько обновлений может ждать в очереди одной полосы
+lane_queue_size = 100
+# Формат выгрузки пользователей для администратора: 'csv' или 'xlsx' (нужен openpyxl)
+export_format = 'csv'
+# Пользователей на одной странице списка
+users_page_size = 20
+
+# Способ получения обновлений: 'polling' или 'webhook'
+bot_mode = 'polling'
+# Настройки webhook (для bot_mode = 'webhook')
+webhook_url = ''  # Внешний адрес бота, например 'https://bot.example.com'
+webhook_listen = '0.0.0.0'  # Адрес встроенного HTTP-сервера
+webhook_port = 8443  # Порт встроенного HTTP-сервера
+webhook_path = '/webhook'  # Путь, на который Telegram шлёт обновления
+webhook_secret = ''  # Секрет из заголовка X-Telegram-Bot-Api-Secret-Token (пусто - случайный, нужен webhook_url)
+webhook_queue_size = 1000  # Сколько обновлений может ждать обработки
+webhook_ssl_cert = None  # Сертификат, если HTTPS без обратного прокси
+webhook_ssl_key = None  # Ключ сертификата
+# Адрес Bot API (None - api.telegram.org); для офлайн-проверки:
+# 'http://127.0.0.1:8081/bot{0}/{1}' и python fake_telegram.py api
+telegram_api_url = None
+# Адрес скачивания файлов (None - api.telegram.org); для офлайн-проверки:
+# 'http://127.0.0.1:8081/file/bot{0}/{1}'
+telegram_file_url = None
+
+# Ограничения исходящих сообщений (очередь outbox)
+outbox_global_rate = 30  # Сообщений в секунду на всего бота
+outbox_chat_rate = 1  # Сообщений в секунду в один чат
+outbox_chat_burst = 3  # Сколько сообщений в чат можно отправить подряд
+outbox_workers = 8  # Одновременных HTTP-запросов к Bot API
+
+# Хранилище состояния диалогов (user_progres, сессии обучения, обработчики
+# следующего шага): 'memory' - в процессе, 'redis' - общее для нескольких
+# процессов бота за одним webhook (для проверки: python fake_redis.py)
+state_backend = 'memory'
+redis_url = 'redis://127.0.0.1:6379/0'
+# Снимок состояния диалогов для тёплого перезапуска (None - не сохранять)
+state_snapshot_file = 'state_snapshot.gz'
+state_snapshot_interval = 30  # Период сохранения снимка, секунд
+# Кэш file_id Telegram для отправляемых файлов (уроки, расписание, ДЗ)
+file_cache_file = 'file_ids.json'
+# Период проверки папок уроков на новые и изменённые файлы, секунд
+lesson_catalog_poll = 5
+# Наибольший размер фото, которое пользователь может сохранить, байт
+photo_max_size = 10 * 1024 * 1024
+# Картинки уроков загружаются уменьшенными (нужен Pillow): самый лёгкий
+# вариант не меньше стольких точек по длинной стороне (960 или 1280)
+image_min_side = 960
+
+# Клиент GigaChat (один на процесс, соединения и токен переиспользуются)
+gigachat_timeout = 60  # Таймаут запроса, секунд
+gigachat_max_concurrency = 8  # Одновременных запросов к GigaChat, остальные ждут
+# Адреса API и авторизации (None - настоящий GigaChat). Для проверок без
+# расхода квоты - локальная заглушка `python fake_gigachat.py --port 8082`:
+# gigachat_base_url = 'http://127.0.0.1:8082/api/v1'
+# gigachat_auth_url = 'http://127.0.0.1:8082/api/v2/oauth'
+gigachat_base_url = None
+gigachat_auth_url = None
+# Ответ GigaChat показывается по мере генерации: сообщение правится не чаще
+# раза в столько секунд (не быстрее outbox_chat_rate)
+stream_edit_interval = 1.0
+# Очередь генераций: столько генераций выполняется одновременно, остальные
+# ждут; задание должно уложиться в срок, ошибка повторяется с паузой
+llm_workers = 8
+llm_job_deadline = 120  # Срок генерации с начала выполнения, секунд
+llm_job_retries = 2  # Повторов после ошибки GigaChat
+llm_retry_backoff = 2.0  # Пауза перед первым повтором, секунд (дальше удваивается)
+# Допуск к генерациям: у каждого пользователя ведро запросов, лишние
+# запросы и запросы при переполненной очереди получают отказ с временем ожидания
+llm_user_rate = 1 / 20  # Запросов в секунду на пользователя (в среднем)
+llm_user_burst = 3  # Запросов подряд
+llm_user_jobs = 2  # Ждущих и выполняемых генераций одного пользователя
+llm_queue_limit = 100  # Наибольшая длина очереди генераций
+
+# Кэш ответов GigaChat (одинаковые вопросы и темы не генерируются заново)
+llm_cache_file = 'llm_cache.db'  # Дисковый уровень кэша
+llm_cache_ttl = 7 * 24 * 3600  # Срок жизни ответа, секунд
+llm_cache_memory_items = 512  # Ответов в памяти
+llm_cache_disk_bytes = 50 * 1024 * 1024  # Наибольший объём кэша на диске, байт
+
+# Банк готовых материалов "Изучить тему" (пополняется командой
+# `python material_bank.py темы.txt` и удачными генерациями новых тем)
+material_bank_file = 'material_bank.json'
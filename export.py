@@ -0,0 +1,122 @@
+# Выгрузка пользователей для администратора
+# Файл строится построчно из user_store, поэтому в памяти никогда
+# не лежат данные всех пользователей сразу
+import csv  # Запись CSV
+import os  # Для удаления временного файла
+import tempfile  # Временный файл выгрузки
+import time  # Дата для счётчика запросов за день
+from datetime import datetime  # Для имени файла
+import user_store  # Общее хранилище данных пользователей
+import history  # Агрегаты истории тестов
+
+# Колонки выгрузки
+HEADER = ['user_id', 'phone', 'level', 'level_math', 'score_math', 'tests', 'mean_score', 'best_score', 'last_score',
+          'llm_today', 'llm_total', 'llm_rejected']
+
+
+def user_row(user_id, user):
+    """Строка выгрузки для одного пользователя"""
+    # Агрегаты уже посчитаны при записи результатов, историю не перебираем
+    stats = history.summary(user.get('history'))
+    quota = llm_quota(user)
+    return [
+        user_id,
+        user.get('phone', ''),
+        user.get('level', ''),
+        user.get('level_math', ''),
+        user.get('score_math', ''),
+        stats['attempts'],  # Количество пройденных тестов
+        _round(stats['mean']),  # Средний результат
+        _round(stats['best']),  # Лучший результат
+        _round(stats['last']),  # Последний результат
+        quota['today'],  # Запросов к GigaChat сегодня
+        quota['total'],  # Запросов к GigaChat всего
+        quota['rejected']  # Отказов по квоте
+    ]
+
+
+def llm_quota(user):
+    """Использование квоты GigaChat (запросы за сегодня, всего, отказы)"""
+    quota = user.get('llm_quota') or {}
+    today = quota.get('today', 0) if quota.get('day') == time.strftime('%Y-%m-%d') else 0
+    return {'today': today, 'total': quota.get('total', 0), 'rejected': quota.get('rejected', 0)}
+
+
+def _round(value):
+    """Округление результата для выгрузки"""
+    return '' if value is None else round(value, 1)
+
+
+def write_users(path, fmt='csv'):
+    """Запись всех пользователей в файл, возвращает сводку
+
+    Сводка: {'total': всего, 'levels': {уровень: количество}}
+    """
+    summary = {'total': 0, 'levels': {}}
+    rows = _count_rows(user_store.iter_users(), summary)
+    if fmt == 'xlsx':
+        _write_xlsx(path, rows)
+    else:
+        with open(path, 'w', newline='', encoding='utf-8-sig') as f:  # BOM для Excel
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(HEADER)
+            writer.writerows(rows)
+    return summary
+
+
+def _count_rows(users, summary):
+    """Строки выгрузки с попутным подсчётом сводки"""
+    for user_id, user in users:
+        summary['total'] += 1
+        level = user.get('level', 0)
+        summary['levels'][level] = summary['levels'].get(level, 0) + 1
+        yield user_row(user_id, user)
+
+
+def _write_xlsx(path, rows):
+    """Запись XLSX в потоковом режиме openpyxl"""
+    from openpyxl import Workbook  # Необязательная зависимость, нужна только для XLSX
+    wb = Workbook(write_only=True)  # Строки сразу уходят в файл
+    ws = wb.create_sheet('Пользователи')
+    ws.append(HEADER)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def send_users_export(bot, chat_id, fmt='csv'):
+    """Выгрузка пользователей одним документом"""
+    fd, path = tempfile.mkstemp(suffix='.' + fmt)
+    os.close(fd)
+    try:
+        summary = write_users(path, fmt)
+        levels = ', '.join(f'{level}: {count}' for level, count in sorted(summary['levels'].items()))
+        with open(path, 'rb') as doc:
+            bot.send_document(
+                chat_id,
+                doc,
+                caption=f'Всего пользователей - {summary["total"]}\nПо уровням - {levels or "нет"}',
+                visible_file_name=f'users_{datetime.now():%Y-%m-%d_%H-%M}.{fmt}'
+            )
+    finally:
+        os.remove(path)
+
+
+def users_page_text(page, page_size):
+    """Текст страницы со списком пользователей и число страниц"""
+    total = user_store.count_users()
+    pages = max(1, (total + page_size - 1) // page_size)
+    page = min(max(page, 0), pages - 1)
+    lines = [f'Пользователи, страница {page + 1} из {pages} (всего {total})']
+    for user_id, user in user_store.page_users(page * page_size, page_size):
+        stats = history.summary(user.get('history'))
+        quota = llm_quota(user)
+        lines.append(
+            f'ID {user_id}: тел. {user.get("phone", "-")}, уровень {user.get("level", 0)}, '
+            f'математика {user.get("level_math", 0)}/{user.get("score_math", 0)}, '
+            f'тестов {stats["attempts"]}'
+            + (f', средний {stats["mean"]:.1f}%' if stats['attempts'] else '')
+            + (f', GigaChat {quota["today"]} сегодня/{quota["total"]} всего' if quota['total'] else '')
+            + (f', отказов {quota["rejected"]}' if quota['rejected'] else '')
+        )
+    return '\n'.join(lines), page, pages
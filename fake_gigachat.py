@@ -0,0 +1,176 @@
+# Локальная заглушка GigaChat для нагрузочных проверок без расхода квоты
+# Отвечает на запрос токена (OAuth) и на /chat/completions, в том числе
+# потоково (text/event-stream, как настоящий API). Задержка первого
+# ответа, скорость выдачи кусков и доля ошибок настраиваются; ответы
+# берутся из сценария (JSON {"подстрока запроса": "ответ"}), а запрос
+# учебных материалов по теме получает правдоподобную теорию и 5 вопросов.
+#
+#     python fake_gigachat.py --port 8082 --latency 1.5 --error-rate 0.05
+#
+# и в config.py: gigachat_base_url = 'http://127.0.0.1:8082/api/v1',
+#                gigachat_auth_url = 'http://127.0.0.1:8082/api/v2/oauth'
+import argparse  # Параметры командной строки
+import json  # Тела запросов и ответов
+import random  # Задержки и ошибки
+import re  # Тема из запроса
+import threading  # Сервер в фоновом потоке
+import time  # Задержки и время ответов
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # HTTP-сервер
+
+TOKEN_TTL = 30 * 60  # Срок действия выданного токена, секунд
+
+
+def materials(topic):
+    """Учебные материалы по теме в формате, который разбирает learn.parse_materials"""
+    theory = '\n\n'.join(
+        f"{i}. {topic}: часть {i}. " + f"Здесь подробно объясняется, как устроена тема «{topic}», с примерами. " * 4
+        for i in range(1, 6)
+    )
+    questions = ''.join(
+        f";;Вопрос {i}\nКакое утверждение о теме «{topic}» верно в случае {i}?\n"
+        f"1. Первое утверждение\n2. Второе утверждение\n3. Третье утверждение\n4. Четвёртое утверждение\n"
+        f"Ответ: {1 + i % 4}\n"
+        for i in range(1, 6)
+    )
+    return f"{theory}\n---\n{questions}"
+
+
+class FakeGigaChat(BaseHTTPRequestHandler):
+    """Заглушка API GigaChat"""
+    latency = 0.5  # Задержка до первого куска ответа, секунд
+    jitter = 0.0  # Случайная добавка к задержке, секунд
+    chunk_size = 40  # Символов в одном куске потокового ответа
+    chunk_delay = 0.02  # Пауза между кусками, секунд
+    error_rate = 0.0  # Доля запросов, завершающихся ошибкой
+    error_status = 503  # Код ошибки
+    script = {}  # Сценарий {подстрока запроса: ответ}
+    counters = {'tokens': 0, 'requests': 0, 'streams': 0, 'errors': 0}
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        path = self.path.split('?', 1)[0]
+        if path.endswith('/oauth'):
+            self._count('tokens')
+            return self._json(200, {'access_token': 'fake-token', 'expires_at': int((time.time() + TOKEN_TTL) * 1000)})
+        if not path.endswith('/chat/completions'):
+            return self._json(404, {'status': 404, 'message': 'not found'})
+        request = json.loads(body or b'{}')
+        self._count('requests')
+        if random.random() < self.error_rate:
+            self._count('errors')
+            time.sleep(self.latency / 2)
+            return self._json(self.error_status, {'status': self.error_status, 'message': 'fake error'})
+        messages = request.get('messages') or [{}]
+        answer = self._answer(messages[-1].get('content', ''))
+        model = request.get('model') or 'GigaChat'
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        if request.get('stream'):
+            self._count('streams')
+            return self._stream(answer, model)
+        self._json(200, {
+            'choices': [{'message': {'role': 'assistant', 'content': answer}, 'index': 0, 'finish_reason': 'stop'}],
+            'created': int(time.time()),
+            'model': model,
+            'usage': self._usage(messages, answer),
+            'object': 'chat.completion'
+        })
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0].endswith('/models'):
+            return self._json(200, {'data': [{'id': 'GigaChat', 'object': 'model', 'owned_by': 'fake'}], 'object': 'list'})
+        self._json(404, {'status': 404, 'message': 'not found'})
+
+    def _answer(self, prompt):
+        """Ответ по сценарию, материалы по теме или эхо запроса"""
+        for fragment, answer in self.script.items():
+            if fragment in prompt:
+                return answer
+        topic = re.search(r'по теме:\s*(.+)', prompt)
+        if topic:
+            return materials(topic.group(1).strip())
+        return f"Ответ заглушки на запрос: {prompt.strip()[:200]}"
+
+    def _stream(self, answer, model):
+        """Потоковый ответ: куски по chunk_size символов, затем [DONE]"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        pieces = [answer[i:i + self.chunk_size] for i in range(0, len(answer), self.chunk_size)]
+        for index, piece in enumerate(pieces):
+            chunk = {
+                'choices': [{
+                    'delta': {'role': 'assistant', 'content': piece},
+                    'index': 0,
+                    'finish_reason': 'stop' if index == len(pieces) - 1 else None
+                }],
+                'created': int(time.time()),
+                'model': model,
+                'object': 'chat.completion'
+            }
+            self.wfile.write(b'data: ' + json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b'\n\n')
+            self.wfile.flush()
+            time.sleep(self.chunk_delay)
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+    @staticmethod
+    def _usage(messages, answer):
+        prompt_tokens = sum(len(m.get('content', '')) for m in messages) // 4
+        completion_tokens = len(answer) // 4
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens}
+
+    def _json(self, status, data):
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def configure(latency=None, jitter=None, chunk_size=None, chunk_delay=None,
+              error_rate=None, error_status=None, script=None):
+    """Настройка заглушки (None - оставить как есть); script - путь к JSON сценария"""
+    settings = {'latency': latency, 'jitter': jitter, 'chunk_size': chunk_size, 'chunk_delay': chunk_delay,
+                'error_rate': error_rate, 'error_status': error_status}
+    for name, value in settings.items():
+        if value is not None:
+            setattr(FakeGigaChat, name, value)
+    if script:
+        with open(script, 'r', encoding='utf-8') as f:
+            FakeGigaChat.script = json.load(f)
+
+
+def serve(host='127.0.0.1', port=8082):
+    """Запуск заглушки; возвращает сервер (serve_forever уже идёт в потоке)"""
+    server = ThreadingHTTPServer((host, port), FakeGigaChat)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальная заглушка GigaChat')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--latency', type=float, default=FakeGigaChat.latency, help='задержка первого куска, с')
+    parser.add_argument('--jitter', type=float, default=0.0, help='случайная добавка к задержке, с')
+    parser.add_argument('--chunk-size', type=int, default=FakeGigaChat.chunk_size, help='символов в куске')
+    parser.add_argument('--chunk-delay', type=float, default=FakeGigaChat.chunk_delay, help='пауза между кусками, с')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ошибочных ответов (0..1)')
+    parser.add_argument('--error-status', type=int, default=FakeGigaChat.error_status, help='код ошибки')
+    parser.add_argument('--script', help='JSON {"подстрока запроса": "ответ"}')
+    options = parser.parse_args()
+    configure(options.latency, options.jitter, options.chunk_size, options.chunk_delay,
+              options.error_rate, options.error_status, options.script)
+    print(f'Заглушка GigaChat: http://{options.host}:{options.port}/api/v1')
+    ThreadingHTTPServer((options.host, options.port), FakeGigaChat).serve_forever()
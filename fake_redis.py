@@ -0,0 +1,123 @@
+# Локальная заглушка Redis для проверки state.RedisState без сервера
+# Понимает протокол RESP и команды, которые использует бот: хэши
+# (HGET/HSET/HDEL/HKEYS/HGETALL), DEL, MULTI/EXEC, PING, SELECT, AUTH.
+# Данные хранятся в памяти процесса заглушки, поэтому несколько
+# процессов бота видят одно состояние, как с настоящим Redis.
+#
+#     python fake_redis.py --port 6379
+#
+# и в config.py: state_backend = 'redis', redis_url = 'redis://127.0.0.1:6379/0'
+import argparse  # Параметры командной строки
+import socketserver  # TCP-сервер
+import threading  # Блокировка данных
+
+_data = {}  # {ключ: {поле: значение}}
+_lock = threading.Lock()
+
+
+def _encode(value):
+    """Ответ в формате RESP"""
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, Exception):
+        return b'-ERR %s\r\n' % str(value).encode('utf-8')
+    if isinstance(value, bool):
+        return b'+OK\r\n' if value else b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(_encode(item) for item in value)
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def _execute(args):
+    """Выполнение одной команды (вызывается под _lock)"""
+    command = args[0].upper()
+    if command == b'PING':
+        return b'PONG'
+    if command in (b'SELECT', b'AUTH'):
+        return True
+    if command == b'HGET':
+        return _data.get(args[1], {}).get(args[2])
+    if command == b'HSET':
+        fields = _data.setdefault(args[1], {})
+        added = 0
+        for field, value in zip(args[2::2], args[3::2]):
+            added += field not in fields
+            fields[field] = value
+        return added
+    if command == b'HDEL':
+        fields = _data.get(args[1], {})
+        removed = sum(fields.pop(field, None) is not None for field in args[2:])
+        if not fields:
+            _data.pop(args[1], None)
+        return removed
+    if command == b'HKEYS':
+        return list(_data.get(args[1], {}))
+    if command == b'HGETALL':
+        return [item for pair in _data.get(args[1], {}).items() for item in pair]
+    if command == b'DEL':
+        return sum(_data.pop(key, None) is not None for key in args[1:])
+    return ValueError(f"unknown command '{command.decode()}'")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Соединение одного клиента"""
+
+    def _read_command(self):
+        """Чтение команды (массив строк RESP), None при закрытии соединения"""
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        queued = None  # Команды внутри MULTI
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            if command == b'MULTI':
+                queued = []
+                reply = True
+            elif command == b'EXEC':
+                with _lock:
+                    reply = [_execute(item) for item in queued or []]
+                queued = None
+            elif queued is not None:
+                queued.append(args)
+                reply = b'QUEUED'
+            else:
+                with _lock:
+                    reply = _execute(args)
+            if reply == b'PONG' or reply == b'QUEUED':
+                self.wfile.write(b'+%s\r\n' % reply)
+            else:
+                self.wfile.write(_encode(reply))
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(host='127.0.0.1', port=6379):
+    """Запуск заглушки; возвращает сервер (serve_forever уже идёт в потоке)"""
+    server = FakeRedis((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальная заглушка Redis')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    options = parser.parse_args()
+    print(f'Заглушка Redis на {options.host}:{options.port}')
+    FakeRedis((options.host, options.port), _Handler).serve_forever()
@@ -0,0 +1,165 @@
+# Локальная замена Telegram для проверки webhook без сети
+# 1) Отправитель обновлений: шлёт на webhook бота сообщения так же,
+#    как это делает Telegram (POST JSON + заголовок с секретом)
+# 2) Заглушка Bot API: принимает исходящие вызовы бота и отвечает
+#    успехом, чтобы бот работал полностью офлайн
+#
+# Пример:
+#   python fake_telegram.py api --port 8081
+#   (в config.py: telegram_api_url = 'http://127.0.0.1:8081/bot{0}/{1}',
+#    telegram_file_url = 'http://127.0.0.1:8081/file/bot{0}/{1}')
+#   python fake_telegram.py send --url http://127.0.0.1:8443/webhook --secret s --text Меню --count 50
+import argparse  # Разбор аргументов командной строки
+import itertools  # Счётчики идентификаторов
+import json  # Тела запросов и ответов
+import time  # Время сообщений и замер отправки
+import urllib.error  # Коды ошибок HTTP
+import urllib.request  # HTTP-клиент без сторонних библиотек
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Заглушка Bot API
+from urllib.parse import parse_qs  # Разбор параметров вызовов Bot API
+from webhook import SECRET_HEADER  # Имя заголовка с секретом
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+_file_ids = itertools.count(1)
+
+
+def make_update(text, user_id=1, chat_id=None):
+    """Обновление с текстовым сообщением в формате Telegram"""
+    chat_id = chat_id or user_id
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'Ученик {user_id}'}
+    return {
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': next(_message_ids),
+            'from': user,
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': user['first_name']},
+            'date': int(time.time()),
+            'text': text
+        }
+    }
+
+
+def send_update(url, update, secret=''):
+    """Отправка одного обновления на webhook, возвращает HTTP-код"""
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode('utf-8'),
+        headers={'Content-Type': 'application/json', SECRET_HEADER: secret},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class FakeBotApi(BaseHTTPRequestHandler):
+    """Заглушка Bot API: любой метод завершается успешно"""
+    calls = []  # Полученные вызовы (метод, параметры) для проверки
+    received_bytes = 0  # Сколько байт тел запросов получено (загрузки файлов)
+    files = {}  # Содержимое файлов для скачивания {file_path: bytes}
+
+    def do_POST(self):
+        # telebot передаёт параметры в строке запроса, файлы - в теле
+        path, _, query = self.path.partition('?')
+        method = path.rsplit('/', 1)[-1]
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        FakeBotApi.received_bytes += length
+        params = {key: values[0] for key, values in parse_qs(query).items()}
+        self.calls.append((method, params))
+        result = self._result(method, params)
+        data = json.dumps({'ok': True, 'result': result}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        # Скачивание файла: /file/bot<токен>/<file_path>
+        if self.path.startswith('/file/'):
+            file_path = self.path.split('/', 3)[3]
+            data = self.files.get(file_path, file_path.encode('utf-8') * 1000)
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self.do_POST()
+
+    @staticmethod
+    def _result(method, params):
+        """Правдоподобный результат вызова"""
+        if method == 'getMe':
+            return {'id': 0, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+        if method == 'getFile':
+            file_id = params.get('file_id', '')
+            return {'file_id': file_id, 'file_unique_id': file_id, 'file_path': f'photos/{file_id}.jpg'}
+        if method == 'sendMediaGroup':
+            # Альбом: по сообщению на каждый элемент media
+            return [
+                FakeBotApi._result('send' + item['type'].capitalize(), {
+                    'chat_id': params.get('chat_id'),
+                    item['type']: '' if item['media'].startswith('attach://') else item['media']
+                })
+                for item in json.loads(params.get('media') or '[]')
+            ]
+        if method.startswith(('send', 'edit')):
+            chat_id = int(params.get('chat_id') or 0)
+            message = {
+                'message_id': next(_message_ids),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'date': int(time.time()),
+                'text': params.get('text', '')
+            }
+            # Отправленный файл получает file_id (повторная отправка по нему - тот же id)
+            kind = method[4:].lower()
+            if kind in ('photo', 'document', 'video', 'audio'):
+                file_id = params.get(kind) or f'{kind}-{next(_file_ids)}'
+                media = {'file_id': file_id, 'file_unique_id': file_id}
+                if kind == 'photo':
+                    message['photo'] = [dict(media, width=1280, height=720)]
+                elif kind == 'video':
+                    message['video'] = dict(media, width=1280, height=720, duration=1)
+                elif kind == 'audio':
+                    message['audio'] = dict(media, duration=1)
+                else:
+                    message['document'] = media
+            return message
+        return True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная замена Telegram')
+    sub = parser.add_subparsers(dest='command', required=True)
+    api = sub.add_parser('api', help='заглушка Bot API')
+    api.add_argument('--port', type=int, default=8081)
+    send = sub.add_parser('send', help='отправка обновлений на webhook')
+    send.add_argument('--url', default='http://127.0.0.1:8443/webhook')
+    send.add_argument('--secret', default='')
+    send.add_argument('--text', default='Меню')
+    send.add_argument('--count', type=int, default=1)
+    send.add_argument('--users', type=int, default=1, help='сколько разных пользователей')
+    args = parser.parse_args()
+
+    if args.command == 'api':
+        print(f"Заглушка Bot API: http://127.0.0.1:{args.port}/bot{{0}}/{{1}}")
+        ThreadingHTTPServer(('127.0.0.1', args.port), FakeBotApi).serve_forever()
+    else:
+        started = time.perf_counter()
+        codes = {}
+        for i in range(args.count):
+            code = send_update(args.url, make_update(args.text, user_id=1 + i % args.users), args.secret)
+            codes[code] = codes.get(code, 0) + 1
+        elapsed = time.perf_counter() - started
+        print(f"Отправлено {args.count} за {elapsed:.2f} с, ответы: {codes}")
+
+
+if __name__ == '__main__':
+    main()
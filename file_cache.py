@@ -0,0 +1,194 @@
+# Кэш file_id Telegram для отправляемых файлов
+# После первой загрузки файла Telegram возвращает file_id; повторные
+# отправки ссылаются на него и не передают байты файла. Запись кэша
+# привязана к размеру и времени изменения файла: изменённый файл
+# загружается заново. Кэш хранится в JSON и переживает перезапуск
+import json  # Формат файла кэша
+import os  # Размер и время изменения файлов
+import threading  # Кэш используется из разных потоков
+from contextlib import ExitStack  # Открытые файлы альбома
+from telebot import types  # Элементы альбома
+from telebot.apihelper import ApiTelegramException  # Ошибка Bot API (устаревший file_id)
+import image_variants  # Уменьшенные варианты картинок для загрузки
+
+CACHE_FILE = 'file_ids.json'  # Файл кэша {путь: {'size', 'mtime', 'file_id'}}
+ALBUM_SIZE = 10  # Больше элементов в одном альбоме Telegram не принимает
+
+# Элементы альбома по типу файла
+MEDIA_TYPES = {
+    'photo': types.InputMediaPhoto,
+    'video': types.InputMediaVideo,
+    'document': types.InputMediaDocument,
+    'audio': types.InputMediaAudio
+}
+
+_entries = {}  # Записи кэша
+_lock = threading.Lock()  # Защищает _entries и файл кэша
+_loaded = False  # Загружен ли кэш с диска
+
+
+def load(path=None):
+    """Загрузка кэша с диска (path - другой файл кэша)"""
+    global CACHE_FILE, _entries, _loaded
+    with _lock:
+        if path:
+            CACHE_FILE = path
+        try:
+            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
+                _entries = json.load(f)
+        except FileNotFoundError:
+            _entries = {}
+        except ValueError as e:
+            print(f"Кэш file_id {CACHE_FILE} повреждён и будет создан заново: {e}")
+            _entries = {}
+        _loaded = True
+
+
+def _save():
+    """Запись кэша на диск (вызывается под _lock)"""
+    tmp = CACHE_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_entries, f, ensure_ascii=False)
+    os.replace(tmp, CACHE_FILE)
+
+
+def _is_url(source):
+    return source.startswith(('http://', 'https://'))
+
+
+def _signature(source):
+    """Размер и время изменения файла (для URL - нули)"""
+    if _is_url(source):
+        return 0, 0
+    stat = os.stat(source)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def get(source, signature=None):
+    """file_id для файла или URL, если файл не менялся после загрузки
+
+    signature - уже известные размер и время изменения файла (например, из
+    каталога уроков), тогда файл не проверяется на диске
+    """
+    if not _loaded:
+        load()
+    key = os.path.normpath(source) if not _is_url(source) else source
+    size, mtime = signature or _signature(source)
+    with _lock:
+        entry = _entries.get(key)
+    if entry and entry['size'] == size and entry['mtime'] == mtime:
+        return entry['file_id']
+    return None
+
+
+def put(source, file_id, signature=None):
+    """Запоминание file_id (signature - размер и время файла на момент загрузки)"""
+    put_many([(source, file_id, signature)])
+
+
+def put_many(records):
+    """Запоминание нескольких file_id одной записью кэша: [(source, file_id, signature)]"""
+    if not _loaded:
+        load()
+    with _lock:
+        for source, file_id, signature in records:
+            key = os.path.normpath(source) if not _is_url(source) else source
+            size, mtime = signature or _signature(source)
+            _entries[key] = {'size': size, 'mtime': mtime, 'file_id': file_id}
+        _save()
+
+
+def forget(source):
+    """Удаление записи (например, Telegram не принял file_id)"""
+    key = os.path.normpath(source) if not _is_url(source) else source
+    with _lock:
+        if _entries.pop(key, None) is not None:
+            _save()
+
+
+def _upload_path(kind, source, signature):
+    """Файл, который реально загружается: для фото - готовый уменьшенный вариант"""
+    return image_variants.best(source, signature) if kind == 'photo' else source
+
+
+def message_file_id(message):
+    """file_id файла из отправленного сообщения"""
+    if message.photo:
+        return message.photo[-1].file_id  # Самый большой вариант фото
+    for name in ('document', 'video', 'audio', 'animation', 'voice'):
+        media = getattr(message, name, None)
+        if media is not None:
+            return media.file_id
+    return None
+
+
+def send_file(bot, kind, chat_id, source, signature=None, **kwargs):
+    """Отправка файла или URL методом bot.send_<kind> с кэшем file_id
+
+        file_cache.send_file(bot, 'photo', chat_id, 'raspisanie_23.jpg', caption='Расписание')
+    """
+    send = getattr(bot, 'send_' + kind)
+    file_id = get(source, signature)
+    if file_id:
+        try:
+            return send(chat_id, file_id, **kwargs)
+        except ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            # file_id недействителен (например, сменился токен бота) - загружаем заново
+            forget(source)
+    if _is_url(source):
+        message = send(chat_id, source, **kwargs)
+        signature = (0, 0)
+    else:
+        signature = signature or _signature(source)
+        with open(_upload_path(kind, source, signature), 'rb') as f:
+            message = send(chat_id, f, **kwargs)
+    file_id = message_file_id(message)
+    if file_id:
+        put(source, file_id, signature)
+    return message
+
+
+def send_album(bot, chat_id, files):
+    """Отправка файлов одним альбомом (send_media_group) с кэшем file_id
+
+    files - до ALBUM_SIZE записей (kind, path, signature, caption); фото и
+    видео можно смешивать, документы и аудио - только с файлами своего типа.
+    Файлы без file_id загружаются одним multipart-запросом. Возвращает
+    список отправленных сообщений
+    """
+    if len(files) == 1:
+        kind, path, signature, caption = files[0]
+        return [send_file(bot, kind, chat_id, path, signature, caption=caption)]
+    use_cache = True
+    while True:
+        uploaded = []  # Файлы, которые загружаются в этом запросе
+        with ExitStack() as stack:
+            media = []
+            for kind, path, signature, caption in files:
+                file_id = get(path, signature) if use_cache else None
+                if file_id is None:
+                    signature = signature or _signature(path)
+                    file_id = stack.enter_context(open(_upload_path(kind, path, signature), 'rb'))
+                    uploaded.append(len(media))
+                media.append(MEDIA_TYPES[kind](file_id, caption=caption))
+            try:
+                messages = bot.send_media_group(chat_id, media)
+            except ApiTelegramException as e:
+                if e.error_code != 400 or not use_cache or len(uploaded) == len(files):
+                    raise
+                # Какой-то file_id недействителен - загружаем весь альбом заново
+                for _, path, _, _ in files:
+                    forget(path)
+                use_cache = False
+                continue
+        records = []
+        for index in uploaded:
+            _, path, signature, _ = files[index]
+            file_id = message_file_id(messages[index])
+            if file_id:
+                records.append((path, file_id, signature))
+        if records:
+            put_many(records)
+        return messages
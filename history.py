@@ -0,0 +1,110 @@
+# Компактная история результатов тестов
+# Вместо списка словарей с датой-строкой хранятся два массива:
+# время в секундах эпохи и результат, плюс готовые агрегаты (в том
+# числе за последние 7 дней - окно сдвигается при добавлении), поэтому
+# сводка по пользователю не перебирает все записи
+import time  # Текущее время в секундах эпохи
+from array import array  # Компактные числовые массивы
+from bisect import bisect_left  # Поиск начала окна по времени
+from datetime import datetime  # Для разбора старых дат
+
+WEEK = 7 * 24 * 3600  # Окно «последние 7 дней», секунд
+
+
+def new():
+    """Пустая история"""
+    return {
+        'ts': array('q'),  # Время прохождения, секунды эпохи (по возрастанию)
+        'scores': array('f'),  # Результат в процентах
+        'attempts': 0,  # Количество попыток
+        'sum': 0.0,  # Сумма результатов (для среднего)
+        'best': None,  # Лучший результат
+        'last': None,  # Последний результат
+        'last_ts': None,  # Время последней попытки
+        'week_start': 0,  # Индекс первой записи окна 7 дней (на момент last_ts)
+        'week_sum': 0.0  # Сумма результатов окна
+    }
+
+
+def add(history, ts, score):
+    """Добавление результата с обновлением агрегатов"""
+    if history['ts'] and ts < history['ts'][-1]:
+        ts = history['ts'][-1]  # Время не убывает, иначе не работает поиск окна
+    history['ts'].append(int(ts))
+    history['scores'].append(float(score))
+    history['attempts'] += 1
+    history['sum'] += float(score)
+    if history['best'] is None or score > history['best']:
+        history['best'] = float(score)
+    history['last'] = float(score)
+    history['last_ts'] = int(ts)
+    # Окно 7 дней: новая запись входит, устаревшие выходят
+    if 'week_start' not in history:
+        _init_window(history)
+    else:
+        history['week_sum'] += float(score)
+    start, total = _expire(history, history['week_start'], history['week_sum'], ts - WEEK)
+    history['week_start'], history['week_sum'] = start, total
+
+
+def _init_window(history):
+    """Окно для истории, сохранённой до появления окна"""
+    start = bisect_left(history['ts'], history['ts'][-1] - WEEK) if history['ts'] else 0
+    history['week_start'] = start
+    history['week_sum'] = float(sum(history['scores'][start:]))
+
+
+def _expire(history, start, total, since):
+    """Сдвиг начала окна за записи старше since; (начало, сумма)"""
+    ts, scores = history['ts'], history['scores']
+    while start < len(ts) and ts[start] < since:
+        total -= scores[start]
+        start += 1
+    return start, total
+
+
+def from_entries(entries):
+    """Перевод старого списка {'score', 'date'} в компактный вид"""
+    history = new()
+    for entry in entries:
+        try:
+            ts = datetime.strptime(entry['date'], "%Y-%m-%d %H:%M").timestamp()
+        except (KeyError, TypeError, ValueError):
+            ts = 0
+        add(history, ts, entry.get('score', 0))
+    return history
+
+
+def stats(history, now=None):
+    """Сводка: попытки, среднее, лучший, последний и то же за 7 дней"""
+    if now is None:
+        now = time.time()
+    result = summary(history)
+    if not history or not history['attempts']:
+        result['week_attempts'], result['week_mean'] = 0, None
+        return result
+    if 'week_start' in history:
+        # Окно посчитано при последней записи; с тех пор могли устареть
+        # только первые записи окна
+        start, total = _expire(history, history['week_start'], history['week_sum'], now - WEEK)
+    else:
+        # История, сохранённая до появления окна, - окно до первой записи
+        start = bisect_left(history['ts'], now - WEEK)
+        total = float(sum(history['scores'][start:]))
+    count = len(history['ts']) - start
+    result['week_attempts'] = count
+    result['week_mean'] = total / count if count else None
+    return result
+
+
+def summary(history):
+    """Агрегаты без окна по времени"""
+    if not history or not history['attempts']:
+        return {'attempts': 0, 'mean': None, 'best': None, 'last': None, 'last_ts': None}
+    return {
+        'attempts': history['attempts'],
+        'mean': history['sum'] / history['attempts'],
+        'best': history['best'],
+        'last': history['last'],
+        'last_ts': history['last_ts']
+    }
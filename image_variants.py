@@ -0,0 +1,152 @@
+# Уменьшенные варианты картинок для отправки в Telegram
+# Telegram всё равно пережимает фото до 1280 точек по длинной стороне,
+# поэтому загружать PNG в исходном размере незачем. Фоновый поток (или
+# запуск `python image_variants.py файлы...` заранее) делает из картинки
+# JPEG-варианты нескольких размеров и кладёт их в кэш по хэшу исходного
+# файла (image_cache/<sha256>/). При отправке выбирается самый лёгкий
+# вариант, который ещё не меньше MIN_SIDE точек; если такого нет или
+# Pillow не установлен, отправляется исходный файл
+import hashlib  # Хэш содержимого
+import json  # Описание вариантов
+import os  # Для работы с файловой системой
+import queue  # Очередь картинок на обработку
+import sys  # Аргументы командной строки
+import threading  # Фоновый поток
+
+CACHE_DIR = 'image_cache'  # Каталог кэша вариантов
+# Варианты: (имя, длинная сторона, качество JPEG)
+VARIANTS = (('1280', 1280, 85), ('960', 960, 80))
+MIN_SIDE = 960  # Меньше этого по длинной стороне картинка считается слишком мелкой
+VERSION = 1  # Версия обработки; при изменении VARIANTS кэш пересобирается
+
+_best = {}  # {(путь, размер, время изменения): путь к лучшему варианту}
+_queue = queue.Queue()  # Картинки на обработку: (путь, размер, время изменения)
+_worker = None  # Фоновый поток
+
+
+def _file_hash(path):
+    """sha256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _make_variants(path, folder):
+    """Создание вариантов картинки; возвращает {имя: {'path', 'bytes', 'side'}}"""
+    from PIL import Image, ImageOps  # Необязательная зависимость, нужна только для вариантов
+    with Image.open(path) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # JPEG без прозрачности - подкладываем белый фон
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        os.makedirs(folder, exist_ok=True)
+        variants = {}
+        for name, side, quality in VARIANTS:
+            variant = image.copy()
+            variant.thumbnail((side, side), Image.LANCZOS)  # Только уменьшение
+            target = os.path.join(folder, name + '.jpg')
+            variant.save(target, 'JPEG', quality=quality, optimize=True, progressive=True)
+            variants[name] = {'path': target, 'bytes': os.path.getsize(target), 'side': max(variant.size)}
+        source_side = max(image.size)
+    return variants, source_side
+
+
+def build(path):
+    """Варианты картинки из кэша или после обработки; возвращает путь к лучшему"""
+    digest = _file_hash(path)
+    folder = os.path.join(CACHE_DIR, digest)
+    index = os.path.join(folder, 'variants.json')
+    try:
+        with open(index, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != VERSION:
+            data = None
+    except (OSError, ValueError):
+        data = None
+    if data is None:
+        variants, source_side = _make_variants(path, folder)
+        data = {'version': VERSION, 'side': source_side, 'variants': variants}
+        with open(index + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(index + '.tmp', index)
+    return choose(path, data)
+
+
+def choose(path, data):
+    """Самый лёгкий достаточно крупный вариант (или исходный файл)"""
+    need = min(MIN_SIDE, data['side'])  # Маленькую картинку не увеличиваем
+    best, best_bytes = path, os.path.getsize(path)
+    for variant in data['variants'].values():
+        if variant['side'] >= need and variant['bytes'] < best_bytes:
+            best, best_bytes = variant['path'], variant['bytes']
+    return best
+
+
+def best(path, signature):
+    """Путь к файлу для загрузки картинки: готовый вариант или сам файл"""
+    return _best.get((path, *signature)) or path
+
+
+def add(path, signature=None):
+    """Постановка картинки в очередь обработки"""
+    if signature is None:
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+    if (path, *signature) not in _best:
+        _queue.put((path, *signature))
+
+
+def _enqueue(lesson, files):
+    """Постановка картинок урока в очередь (подписка на каталог уроков)"""
+    for item in files:
+        if item.kind == 'photo':
+            add(item.path, (item.size, item.mtime))
+
+
+def _work():
+    """Фоновый поток: обработка картинок из очереди"""
+    while True:
+        key = _queue.get()
+        if key in _best:
+            continue
+        try:
+            _best[key] = build(key[0])
+        except ImportError as e:
+            print(f"Варианты картинки {key[0]} не созданы: {e}")
+            _best[key] = None
+        except Exception as e:
+            print(f"Ошибка обработки картинки {key[0]}: {e}")
+            _best[key] = None
+
+
+def start(catalog, extra=()):
+    """Запуск фоновой обработки картинок уроков и дополнительных файлов"""
+    global _worker
+    if _worker is None:
+        _worker = threading.Thread(target=_work, name='image-variants', daemon=True)
+        _worker.start()
+        catalog.subscribe(_enqueue)
+    for path in extra:
+        try:
+            add(path)
+        except OSError as e:
+            print(f"Картинка {path} не найдена: {e}")
+
+
+if __name__ == '__main__':
+    # Подготовка вариантов заранее: python image_variants.py raspisanie_23.jpg "Урок 1"
+    for argument in sys.argv[1:]:
+        paths = [argument] if os.path.isfile(argument) else [
+            os.path.join(argument, name) for name in sorted(os.listdir(argument))
+            if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+        ]
+        for path in paths:
+            chosen = build(path)
+            print(f"{path}: {os.path.getsize(path)} -> {os.path.getsize(chosen)} байт ({chosen})")
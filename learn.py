@@ -1,14 +1,24 @@
 # Импорт необходимых модулей
-import os  # Для работы с файловой системой
-import pickle  # Для сериализации/десериализации данных
 from telebot import types  # Для работы с элементами интерфейса Telegram бота
-from request import gpt_request  # Импорт функции для запросов к GPT-модели
+from request import gpt_stream_async, forget_cached  # Потоковый запрос к GPT-модели
+from async_runtime import run_sync  # Вызовы Bot API из цикла asyncio
+from functools import partial  # Задания очереди генераций
+from contextlib import aclosing  # Генерация прерывается вместе с заданием
+import material_bank  # Готовые материалы по темам
+import llm_admission  # Допуск запросов к GigaChat
 import re  # Для работы с регулярными выражениями
-from datetime import datetime  # Для работы с датой и временем
+import user_store  # Общее хранилище данных пользователей
+import outbox  # Массовые отправки уступают интерактивным ответам
+from state import StateDict  # Общее хранилище состояния диалогов
+from live_message import LiveMessage  # Теория показывается по мере генерации
+import config  # Частота правок сообщения
 
-# Глобальный словарь для хранения активных сессий обучения
-# Формат: {chat_id: session_data}
-learning_sessions = {}
+# Разделители теории и вопросов в ответе GPT (см. parse_materials)
+SEPARATORS = ('---', 'Вопросы по теме')
+
+# Активные сессии обучения в общем хранилище состояния
+# Формат: {chat_id: session_data}; изменённую сессию нужно записать обратно
+learning_sessions = StateDict('learning_sessions')
 
 def init_learning_module(bot_instance):
     """Инициализация модуля с экземпляром бота"""
@@ -44,108 +54,155 @@ def process_topic_input(message):
         cleanup_session(message.chat.id)  # Очищаем сессию
         return bot.send_message(message.chat.id, "Обучение отменено", reply_markup=types.ReplyKeyboardRemove())
     
-    # Формируем промпт для GPT с четкими инструкциями по формату
-    prompt = f"""
-    Создай подробные учебные материалы, минимум 5 абзацев по теме: {message.text}
+    # Готовые материалы из банка - сразу, без генерации
+    chat_id = message.chat.id
+    bundle = material_bank.get(message.text)
+    if bundle is not None:
+        theory, questions = bundle
+        store_materials(chat_id, theory, questions)
+        return send_learning_materials(chat_id, theory)
+    
+    # Новая тема - генерация ставится в очередь генераций, поток обработчика
+    # сразу свободен
+    prompt = material_prompt(message.text)
+    live = LiveMessage(bot, chat_id, interval=getattr(config, 'stream_edit_interval', 1.0))
+    wait = llm_admission.enqueue(
+        message.from_user.id, chat_id, partial(generate_materials, live, chat_id, message.text, prompt),
+        on_status=live.status, on_failed=partial(run_sync, cleanup_session, chat_id)
+    )
+    # Слишком частые запросы получают отказ, тему можно ввести ещё раз позже
+    if wait:
+        msg = bot.send_message(chat_id, llm_admission.refusal(wait) + ". Введите тему позже или нажмите «Отмена»")
+        return bot.register_next_step_handler(msg, process_topic_input)
+
+def material_prompt(topic):
+    """Промпт для GPT с четкими инструкциями по формату"""
+    return f"""
+    Создай подробные учебные материалы, минимум 5 абзацев по теме: {topic}
     Создай 5 вопросов по темe.
     Шаблон ответа:
     Теоретическая часть (структурированный текст с примерами)
     ---
     Вопросы по теме только с 1 вариантом правильного ответа. В каждом вопросе 4 варианта ответа. Задай нумерацию цифрами от 1 до 4 (никогда не используй буквы в нумерации) вопросов и ответов. Сделай так, чтобы вопросы было удобно считывать посредством программы. Пусть вопрос начинается со слова ";;Вопрос", затем идёт тело Вопроса и варианты Ответа и заканчивается словом "Ответ". После которого идёт номер правильного ответа. Слово "Ответ" не надо дублировать.
     """
-    
-    # Показываем индикатор набора текста
-    bot.send_chat_action(message.chat.id, 'typing')
-    # Отправляем запрос к GPT
-    response = gpt_request(prompt)
-    
-    # Обработка ошибки генерации
+
+async def generate_materials(live, chat_id, topic, prompt):
+    """Генерация материалов (одна попытка задания очереди): теория
+    показывается по мере генерации"""
+    await live.status('📖 Готовлю материалы...')
+    # Отправляем запрос к GPT (ошибка - повтор силами очереди генераций)
+    response = ''
+    async with aclosing(gpt_stream_async(prompt)) as stream:
+        async for piece in stream:
+            response += piece
+            await live.update(streamed_theory(response))
     if not response:
-        cleanup_session(message.chat.id)
-        return bot.send_message(message.chat.id, "Ошибка при генерации материалов")
+        raise ValueError('GigaChat вернул пустой ответ')
 
     # Парсинг ответа от GPT
     try:
-        # Разделяем теорию и вопросы по разделителю ---
-        if '---' in response:
-            theory_part = response.split('---', 1)[:-1]  # Теоретическая часть
-            questions_part = response.split('---', 1)[-1]  # Часть с вопросами
-        elif 'Вопросы по теме' in response:
-            theory_part = response.split('Вопросы по теме', 1)[:-1]
-            questions_part = response.split('Вопросы по теме', 1)[-1]
-        else:
-            theory_part = response
-            questions_part = ""
-        
-        # Обработка случая, когда theory_part - список
-        if type(theory_part) == list:
-            theory_part = ' '.join(theory_part)
-        theory = theory_part.strip()  # Очищаем от лишних пробелов
-        questions = []  # Список для хранения вопросов
-        
-        # Подготовка текста вопросов к парсингу
-        questions_part = questions_part.replace('*','')  # Удаляем маркеры форматирования
-        question_blocks = questions_part.split(';')[1:]  # Разбиваем по разделителю ;;
-        
-        # Парсинг каждого блока вопроса
-        for block in question_blocks:
-            if not block.strip():  # Пропускаем пустые блоки
-                continue
-                
-            try:
-                # Разбиваем блок на строки и очищаем их
-                lines = [line.strip() for line in block.split('\n') if line.strip()]
-                
-                # Извлекаем текст вопроса (эвристически)
-                if len(lines[0])>10:  # Если первая строка длинная - это вопрос
-                    question_text = lines[0]
-                else:  # Иначе вопрос во второй строке
-                    question_text = lines[1]
-                
-                # Извлекаем варианты ответов (ищем строки с цифрами)
-                options = []
-                for line in lines[-6:-1]:  # Ищем в последних строках
-                    if line and line[0].isdigit() and line[1] in ('.', ')'):
-                        options.append(line[2:].strip())  # Добавляем вариант без номера
-                
-                # Извлекаем номер правильного ответа (из последней строки)
-                answer_line = lines[-1]
-                # Удаляем все нецифровые символы для получения номера
-                correct_answer = int(re.sub(r'[^0-9]', '', answer_line))
-                
-                # Проверяем корректность данных и сохраняем вопрос
-                if question_text and len(options) == 4 and correct_answer is not None and correct_answer <=4:
-                    formatted_question = {
-                        'text': question_text,  # Текст вопроса
-                        'options': options,  # Варианты ответов
-                        'correct': correct_answer,  # Номер правильного ответа (1-based)
-                        'original_format': block  # Оригинальный текст для отладки
-                    }
-                    questions.append(formatted_question)    
-            except Exception as e:
-                print(f"Ошибка парсинга вопроса: {e}")
-                continue
-        
-        # Проверяем, что получили хотя бы один вопрос
-        if not questions:
-            raise ValueError("Не удалось извлечь вопросы из ответа")
-            
+        theory, questions = parse_materials(response)
     except Exception as e:
         print(f"Ошибка парсинга ответа: {e}")
-        cleanup_session(message.chat.id)
-        return bot.send_message(message.chat.id, "Ошибка при обработке материалов. Попробуйте другую тему.")
+        await forget_cached(prompt)  # Неудачный ответ не должен вернуться из кэша
+        await run_sync(cleanup_session, chat_id)
+        return await run_sync(bot.send_message, chat_id, "Ошибка при обработке материалов. Попробуйте другую тему.")
     
-    # Сохраняем данные в сессию
-    learning_sessions[str(message.chat.id)] = {
+    # Окончательный текст теории (вопросы пользователю не показываются)
+    await live.update(theory, final=True)
+
+    # Сохраняем данные в сессию, удачные материалы новой темы - в банк
+    store_materials(chat_id, theory, questions)
+    await run_sync(material_bank.add, topic, theory, questions)
+    
+    # Теория уже в чате - предлагаем тест
+    await run_sync(offer_test, chat_id)
+
+def store_materials(chat_id, theory, questions):
+    """Сохранение материалов в сессию обучения"""
+    learning_sessions[str(chat_id)] = {
         'stage': 'materials_shown',  # Текущий этап
         'theory': theory,  # Теоретическая часть
         'questions': questions,  # Список вопросов
         'current_question': 0,  # Индекс текущего вопроса
         'correct_answers': 0  # Счетчик правильных ответов
     }
+
+def streamed_theory(response):
+    """Теоретическая часть ещё не законченного ответа GPT"""
+    for separator in SEPARATORS:
+        if separator in response:
+            return response.split(separator, 1)[0].strip()
+    # Хвост может оказаться началом разделителя - его покажем позже
+    return response[:-max(map(len, SEPARATORS))].strip()
+
+def parse_materials(response):
+    """Разбор ответа GPT на теорию и список вопросов"""
+    # Разделяем теорию и вопросы по разделителю ---
+    if '---' in response:
+        theory_part = response.split('---', 1)[:-1]  # Теоретическая часть
+        questions_part = response.split('---', 1)[-1]  # Часть с вопросами
+    elif 'Вопросы по теме' in response:
+        theory_part = response.split('Вопросы по теме', 1)[:-1]
+        questions_part = response.split('Вопросы по теме', 1)[-1]
+    else:
+        theory_part = response
+        questions_part = ""
+
+    # Обработка случая, когда theory_part - список
+    if type(theory_part) == list:
+        theory_part = ' '.join(theory_part)
+    theory = theory_part.strip()  # Очищаем от лишних пробелов
+    questions = []  # Список для хранения вопросов
+
+    # Подготовка текста вопросов к парсингу
+    questions_part = questions_part.replace('*','')  # Удаляем маркеры форматирования
+    question_blocks = questions_part.split(';')[1:]  # Разбиваем по разделителю ;;
+
+    # Парсинг каждого блока вопроса
+    for block in question_blocks:
+        if not block.strip():  # Пропускаем пустые блоки
+            continue
+
+        try:
+            # Разбиваем блок на строки и очищаем их
+            lines = [line.strip() for line in block.split('\n') if line.strip()]
+
+            # Извлекаем текст вопроса (эвристически)
+            if len(lines[0])>10:  # Если первая строка длинная - это вопрос
+                question_text = lines[0]
+            else:  # Иначе вопрос во второй строке
+                question_text = lines[1]
+
+            # Извлекаем варианты ответов (ищем строки с цифрами)
+            options = []
+            for line in lines[-6:-1]:  # Ищем в последних строках
+                if line and line[0].isdigit() and line[1] in ('.', ')'):
+                    options.append(line[2:].strip())  # Добавляем вариант без номера
+
+            # Извлекаем номер правильного ответа (из последней строки)
+            answer_line = lines[-1]
+            # Удаляем все нецифровые символы для получения номера
+            correct_answer = int(re.sub(r'[^0-9]', '', answer_line))
+
+            # Проверяем корректность данных и сохраняем вопрос
+            if question_text and len(options) == 4 and correct_answer is not None and correct_answer <=4:
+                formatted_question = {
+                    'text': question_text,  # Текст вопроса
+                    'options': options,  # Варианты ответов
+                    'correct': correct_answer,  # Номер правильного ответа (1-based)
+                    'original_format': block  # Оригинальный текст для отладки
+                }
+                questions.append(formatted_question)    
+        except Exception as e:
+            print(f"Ошибка парсинга вопроса: {e}")
+            continue
+
+    # Проверяем, что получили хотя бы один вопрос
+    if not questions:
+        raise ValueError("Не удалось извлечь вопросы из ответа")
     
-    # Отправляем материалы пользователю
-    send_learning_materials(message.chat.id, theory)
+    return theory, questions
     
 def send_learning_materials(chat_id, theory):
     """Отправка учебных материалов"""
@@ -154,22 +211,27 @@ def send_learning_materials(chat_id, theory):
     parts = [theory[i:i+max_length] for i in range(0, len(theory), max_length)]
     
     # Отправляем каждую часть отдельным сообщением
-    for part in parts:
-        bot.send_message(chat_id, part)
-    
+    with outbox.bulk():
+        for part in parts:
+            bot.send_message(chat_id, part)
+    offer_test(chat_id)
+
+def offer_test(chat_id):
+    """Предложение пройти тест по показанным материалам"""
     # Создаем клавиатуру с вариантами действий
     markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
     markup.add(types.KeyboardButton("Пройти тест"))
     markup.add(types.KeyboardButton("Отмена"))
     
+    # Регистрируем обработчик выбора пользователя заранее: offer_test
+    # вызывается не из полосы чата, и быстрый ответ мог бы его опередить
+    bot.register_next_step_handler_by_chat_id(chat_id, handle_test_decision)
     # Отправляем предложение пройти тест
     bot.send_message(
         chat_id,
         "📚 Материалы готовы. Хотите пройти тест для закрепления?",
         reply_markup=markup
     )
-    # Регистрируем обработчик выбора пользователя
-    bot.register_next_step_handler_by_chat_id(chat_id, handle_test_decision)
 
 def handle_test_decision(message):
     """Обработка решения о прохождении теста"""
@@ -184,6 +246,7 @@ def handle_test_decision(message):
         session = learning_sessions.get(str(message.chat.id))
         if session and 'questions' in session:
             session['stage'] = 'testing'  # Меняем этап на тестирование
+            learning_sessions[str(message.chat.id)] = session
             send_question_gpt(str(message.chat.id), 0)  # Начинаем с первого вопроса
         else:
             bot.send_message(message.chat.id, "Сессия устарела. Начните заново.")
@@ -228,6 +291,46 @@ def send_question_gpt(chat_id, question_idx):
     # Сохраняем состояние
     session['current_question'] = question_idx  # Текущий вопрос
     session['last_question_msg'] = msg.message_id  # ID сообщения для редактирования
+    learning_sessions[chat_id] = session
+
+def handle_test_answer(call):
+    """Обработка ответов на вопросы теста"""
+    chat_id = str(call.message.chat.id)
+    session = learning_sessions.get(chat_id)
+    if not session or session['stage'] != 'testing':
+        return
+    
+    # print(call.data)
+    _, q_idx, a_idx, c_idx = call.data.split('_')
+    # print(q_idx,a_idx, c_idx)
+    q_idx, a_idx, c_idx = map(int, (q_idx, a_idx, c_idx))
+    question = session['questions'][q_idx]
+    
+    # Формируем ответ
+    response_msg = (
+        f"{call.message.text}\n\n"
+        f" Ваш ответ: {a_idx+1}. {question['options'][a_idx]}\n"
+    )
+    
+    if a_idx+1 == c_idx:
+        session['correct_answers'] += 1
+        learning_sessions[chat_id] = session  # Запись изменённой сессии в хранилище
+        response_msg += " Верно!"
+    else:
+        response_msg += (
+            f" Неверно.\n"
+            f" Правильный ответ: {c_idx}. {question['options'][c_idx-1]}"
+        )
+    
+    # Редактируем сообщение
+    bot.edit_message_text(
+        chat_id=chat_id,
+        message_id=session['last_question_msg'],
+        text=response_msg
+    )
+    
+    # Следующий вопрос
+    send_question_gpt(chat_id, q_idx + 1)
 
 def finish_test_session(chat_id):
     """Завершение теста и вывод результатов"""
@@ -271,25 +374,8 @@ def finish_test_session(chat_id):
 def save_test_results(user_id, score):
     """Сохранение результатов теста"""
     try:
-        # Загружаем данные пользователя
-        user_data = load_user_data()
-        user_id_str = str(user_id)
-        
-        if user_id_str not in user_data:
-            return False
-        
-        # Инициализируем историю обучения, если нет
-        if 'learning_history' not in user_data[user_id_str]:
-            user_data[user_id_str]['learning_history'] = []
-        
-        # Добавляем новый результат
-        user_data[user_id_str]['learning_history'].append({
-            'score': score,  # Результат в процентах
-            'date': datetime.now().strftime("%Y-%m-%d %H:%M")  # Время прохождения
-        })
-        # Сохраняем обновленные данные
-        save_user_data(user_data)
-        return True
+        # Добавляем результат в компактную историю (время - текущее)
+        return user_store.add_result(user_id, score)
     except Exception as e:
         print(f"Ошибка сохранения результатов: {e}")
         return False
@@ -310,16 +396,3 @@ def cleanup_session(chat_id):
         "Чтобы вернуться в меню нажмите",
         reply_markup=markup
     )
-
-# Функции для работы с данными пользователей
-def load_user_data():
-    """Загрузка данных пользователей из файла"""
-    if os.path.exists('user_data.pkl'):
-        with open('user_data.pkl', 'rb') as f:  # Открываем файл для чтения
-            return pickle.load(f)  # Десериализуем данные
-    return {}  # Возвращаем пустой словарь, если файла нет
-
-def save_user_data(data):
-    """Сохранение данных пользователей в файл"""
-    with open('user_data.pkl', 'wb') as f:  # Открываем файл для записи
-        pickle.dump(data, f)  # Сериализуем и сохраняем данные
\ No newline at end of file
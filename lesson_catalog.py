@@ -0,0 +1,129 @@
+# Каталог уроков: упорядоченный список файлов каждой папки урока
+# Строится при старте по словарю lessons из config.py; тексты уроков
+# читаются сразу, для остальных файлов запоминаются размер и время
+# изменения (для кэша file_id). Фоновый поток раз в несколько секунд
+# сверяет папки с каталогом и пересобирает урок, если учитель добавил,
+# удалил или изменил файл. Отправка урока обращается только к каталогу
+import os  # Для работы с файловой системой
+import re  # Естественная сортировка имён
+import threading  # Фоновый поток проверки папок
+from collections import namedtuple  # Запись о файле урока
+
+# Тип файла по расширению (регистр не важен: Урок_3.PNG - тоже картинка)
+KINDS = {
+    '.txt': 'text',
+    '.jpg': 'photo', '.jpeg': 'photo', '.png': 'photo',
+    '.mp4': 'video', '.mov': 'video',
+    '.pdf': 'pdf',
+    '.mp3': 'audio',
+    '.docx': 'docx'
+}
+POLL_INTERVAL = 5  # Период проверки папок, секунд
+
+# Файл урока: тип, путь, имя, размер, время изменения (нс), текст (для 'text')
+LessonFile = namedtuple('LessonFile', 'kind path name size mtime text')
+
+_lessons = {}  # {название урока: папка}
+_manifests = {}  # {название урока: tuple(LessonFile)}
+_signatures = {}  # {название урока: состояние папки при последней сборке}
+_listeners = []  # Функции listener(lesson, files), вызываемые после пересборки урока
+_lock = threading.Lock()  # Не даёт двум пересборкам идти одновременно
+_watcher = None  # Фоновый поток проверки
+_stop = threading.Event()  # Сигнал остановки фонового потока
+
+
+def _natural_key(name):
+    """Ключ естественной сортировки: 'Урок 2' раньше 'Урок 10'"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+
+def _scan(folder):
+    """Состояние папки: отсортированные (имя, размер, время изменения) файлов"""
+    entries = []
+    try:
+        for entry in os.scandir(folder):
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    except FileNotFoundError:
+        return ()
+    return tuple(sorted(entries, key=lambda item: _natural_key(item[0])))
+
+
+def _build(folder, signature):
+    """Список файлов урока по состоянию папки"""
+    files = []
+    for name, size, mtime in signature:
+        kind = KINDS.get(os.path.splitext(name)[1].lower())
+        if kind is None:
+            continue  # Неизвестные файлы (например, временные) не отправляются
+        path = os.path.join(folder, name)
+        text = None
+        if kind == 'text':
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Не удалось прочитать {path}: {e}")
+                continue
+        files.append(LessonFile(kind, path, name, size, mtime, text))
+    return tuple(files)
+
+
+def refresh():
+    """Сверка папок с каталогом; возвращает названия пересобранных уроков"""
+    changed = []
+    with _lock:
+        for lesson, folder in _lessons.items():
+            signature = _scan(folder)
+            if _signatures.get(lesson) == signature:
+                continue
+            _manifests[lesson] = _build(folder, signature)
+            _signatures[lesson] = signature
+            changed.append(lesson)
+    for lesson in changed:
+        _notify(lesson)
+    return changed
+
+
+def _notify(lesson):
+    """Сообщение подписчикам о пересобранном уроке"""
+    for listener in list(_listeners):
+        try:
+            listener(lesson, manifest(lesson))
+        except Exception as e:
+            print(f"Ошибка обработчика каталога уроков: {e}")
+
+
+def subscribe(listener):
+    """Подписка на изменения уроков; listener сразу получает текущие уроки"""
+    _listeners.append(listener)
+    for lesson in list(_manifests):
+        listener(lesson, manifest(lesson))
+
+
+def manifest(lesson):
+    """Файлы урока в порядке отправки (пустой кортеж для неизвестного урока)"""
+    return _manifests.get(lesson, ())
+
+
+def _watch_loop(interval):
+    """Фоновая проверка папок уроков"""
+    while not _stop.wait(interval):
+        try:
+            for lesson in refresh():
+                print(f"Каталог уроков: обновлён {lesson}")
+        except Exception as e:
+            print(f"Ошибка проверки папок уроков: {e}")
+
+
+def start(lessons, interval=POLL_INTERVAL):
+    """Сборка каталога и запуск фоновой проверки папок"""
+    global _watcher
+    with _lock:
+        _lessons.clear()
+        _lessons.update(lessons)
+    refresh()
+    if _watcher is None and interval:
+        _watcher = threading.Thread(target=_watch_loop, args=(interval,), name='lesson-catalog', daemon=True)
+        _watcher.start()
@@ -0,0 +1,170 @@
+# Фоновая подготовка текстов уроков из .docx
+# Фоновый поток извлекает текст из документов урока и режет его на
+# сообщения Telegram по границам абзацев. Результат хранится в кэше,
+# адресованном хэшем содержимого файла (lesson_chunks/<sha256>.json),
+# поэтому после перезапуска документы не разбираются заново, а
+# одинаковые файлы в разных уроках разбираются один раз. Отправка урока
+# только берёт готовые куски из памяти; пока документ не разобран, он
+# пропускается, как и раньше. PDF уходит файлом и не разбирается
+import hashlib  # Хэш содержимого файла
+import json  # Формат кэша
+import os  # Для работы с файловой системой
+import queue  # Очередь документов на разбор
+import threading  # Фоновый поток разбора
+import zipfile  # .docx - это zip-архив с XML
+import xml.etree.ElementTree as ET  # Разбор XML документа Word
+
+CACHE_DIR = 'lesson_chunks'  # Каталог кэша кусков
+CHUNK_LIMIT = 4000  # Длина куска (ограничение Telegram - 4096 символов)
+VERSION = 1  # Версия разбора; при изменении алгоритма кэш пересобирается
+
+W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'  # Пространство имён Word
+
+_chunks = {}  # {(путь, размер, время изменения): [куски текста]}
+_current = {}  # {путь: (размер, время изменения)} - текущие версии документов
+_lessons = {}  # {урок: пути документов} - для чистки при пересборке урока
+_queue = queue.Queue()  # Документы на разбор: (путь, тип, размер, время изменения)
+_worker = None  # Фоновый поток разбора
+
+
+# === Извлечение текста ===
+
+def extract_docx(path):
+    """Абзацы документа Word"""
+    with zipfile.ZipFile(path) as archive:
+        root = ET.fromstring(archive.read('word/document.xml'))
+    paragraphs = []
+    for paragraph in root.iter(W + 'p'):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == W + 't' and node.text:
+                parts.append(node.text)
+            elif node.tag == W + 'tab':
+                parts.append('\t')
+            elif node.tag in (W + 'br', W + 'cr'):
+                parts.append('\n')
+        text = ''.join(parts).strip()
+        if text:
+            paragraphs.append(text)
+    return paragraphs
+
+
+EXTRACTORS = {'docx': extract_docx}
+
+
+def split_chunks(paragraphs, limit=CHUNK_LIMIT):
+    """Склейка абзацев в куски не длиннее limit, разрыв только между абзацами
+
+    Абзац длиннее limit режется по последнему пробелу перед границей
+    """
+    chunks = []
+    current = ''
+    for paragraph in paragraphs:
+        paragraph = paragraph.strip()
+        while len(paragraph) > limit:
+            cut = paragraph.rfind(' ', 0, limit)
+            if cut <= 0:
+                cut = limit
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(paragraph[:cut].rstrip())
+            paragraph = paragraph[cut:].lstrip()
+        if current and len(current) + 2 + len(paragraph) <= limit:
+            current += '\n\n' + paragraph
+        else:
+            if current:
+                chunks.append(current)
+            current = paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# === Кэш по хэшу содержимого ===
+
+def _file_hash(path):
+    """sha256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _load_cached(digest):
+    """Куски из кэша или None"""
+    try:
+        with open(os.path.join(CACHE_DIR, digest + '.json'), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data['chunks'] if data.get('version') == VERSION else None
+
+
+def _save_cached(digest, chunks):
+    """Запись кусков в кэш (tmp + replace)"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, digest + '.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'version': VERSION, 'chunks': chunks}, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def convert(path, kind):
+    """Куски текста документа (из кэша или после разбора)"""
+    digest = _file_hash(path)
+    chunks = _load_cached(digest)
+    if chunks is None:
+        chunks = split_chunks(EXTRACTORS[kind](path))
+        _save_cached(digest, chunks)
+    return chunks
+
+
+# === Фоновый разбор ===
+
+def chunks(item):
+    """Готовые куски файла урока (LessonFile) или None, если он ещё не разобран"""
+    return _chunks.get((item.path, item.size, item.mtime))
+
+
+def _enqueue(lesson, files):
+    """Постановка новых документов урока в очередь (подписка на каталог уроков)"""
+    documents = [item for item in files if item.kind in EXTRACTORS]
+    paths = {item.path for item in documents}
+    # Удалённые из урока документы и старые версии изменённых забываются
+    for path in _lessons.get(lesson, set()) - paths:
+        _current.pop(path, None)
+    _lessons[lesson] = paths
+    for item in documents:
+        _current[item.path] = (item.size, item.mtime)
+    for key in [key for key in list(_chunks) if _current.get(key[0]) != key[1:]]:
+        _chunks.pop(key, None)
+    for item in documents:
+        if (item.path, item.size, item.mtime) not in _chunks:
+            _queue.put((item.path, item.kind, item.size, item.mtime))
+
+
+def _work():
+    """Фоновый поток: разбор документов из очереди"""
+    while True:
+        path, kind, size, mtime = _queue.get()
+        key = (path, size, mtime)
+        if key in _chunks or _current.get(path) != (size, mtime):
+            continue  # Уже разобран или файл успел измениться
+        try:
+            _chunks[key] = convert(path, kind)
+        except Exception as e:
+            print(f"Ошибка разбора {path}: {e}")
+            _chunks[key] = None
+        if _current.get(path) != (size, mtime):
+            _chunks.pop(key, None)  # Пока шёл разбор, урок пересобран
+
+
+def start(catalog):
+    """Запуск фонового разбора документов уроков из каталога"""
+    global _worker
+    if _worker is None:
+        _worker = threading.Thread(target=_work, name='lesson-convert', daemon=True)
+        _worker.start()
+        catalog.subscribe(_enqueue)
@@ -0,0 +1,84 @@
+# Сообщение, которое дописывается по мере генерации ответа
+# Сначала отправляется заглушка, затем текст растёт правками
+# edit_message_text не чаще раза в interval секунд (Telegram ограничивает
+# частоту правок). Когда текст не помещается в одно сообщение, первое
+# сообщение дописывается до границы, а продолжение идёт в новое
+import time  # Монотонные часы для частоты правок
+from telebot.apihelper import ApiTelegramException  # Ошибка Bot API
+from async_runtime import run_sync  # Вызовы Bot API из цикла asyncio
+
+LIMIT = 4000  # Длина одного сообщения (ограничение Telegram - 4096 символов)
+
+
+def split_pages(text, limit=LIMIT):
+    """Разбиение текста на сообщения по последнему переводу строки или пробелу
+
+    Граница страницы зависит только от уже написанного текста, поэтому
+    при дописывании ранние страницы не меняются
+    """
+    pages = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit)
+        if cut <= 0:
+            cut = text.rfind(' ', 0, limit)
+        if cut <= 0:
+            cut = limit
+        pages.append(text[:cut])
+        text = text[cut:].lstrip()
+    pages.append(text)
+    return pages
+
+
+class LiveMessage:
+    """Одно или несколько сообщений чата, показывающих растущий текст"""
+
+    def __init__(self, bot, chat_id, interval=1.0, limit=LIMIT):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.interval = interval
+        self.limit = limit
+        self.message_ids = []  # Отправленные сообщения
+        self.shown = []  # Текст, который сейчас виден в каждом сообщении
+        self.updated = 0.0  # Время последней правки
+
+    async def start(self, placeholder):
+        """Отправка заглушки"""
+        msg = await run_sync(self.bot.send_message, self.chat_id, placeholder)
+        self.message_ids.append(msg.message_id)
+        self.shown.append(placeholder)
+        self.updated = time.monotonic()
+
+    async def update(self, text, final=False):
+        """Показ текста (не чаще interval; final - показать обязательно)"""
+        now = time.monotonic()
+        if not text.strip() or (not final and now - self.updated < self.interval):
+            return
+        for index, page in enumerate(split_pages(text, self.limit)):
+            # Telegram обрезает пробелы по краям - сравниваем уже обрезанный текст
+            page = page.rstrip()
+            if index < len(self.message_ids):
+                if self.shown[index] != page:
+                    await self._edit(index, page)
+                    self.shown[index] = page
+            else:
+                # Текст перерос сообщение - продолжение в новом
+                msg = await run_sync(self.bot.send_message, self.chat_id, page)
+                self.message_ids.append(msg.message_id)
+                self.shown.append(page)
+        self.updated = time.monotonic()
+
+    async def _edit(self, index, page):
+        """Правка сообщения; "не изменено" - не ошибка (текст уже такой)"""
+        try:
+            await run_sync(self.bot.edit_message_text, page,
+                           chat_id=self.chat_id, message_id=self.message_ids[index])
+        except ApiTelegramException as e:
+            if 'message is not modified' not in str(e.description):
+                raise
+
+    async def status(self, text):
+        """Показ служебного текста (место в очереди, ошибка) вместо ответа"""
+        if self.message_ids:
+            await self.update(text, final=True)
+        else:
+            await self.start(text)
@@ -0,0 +1,94 @@
+# Допуск запросов к GigaChat
+# При постановке генерации в очередь проверяется: не переполнена ли
+# общая очередь, не ждёт ли уже пользователь своих генераций и есть ли
+# токен в его ведре (RATE запросов в секунду, не больше BURST подряд).
+# Если нет - пользователь сразу получает "попробуйте через N секунд"
+# вместо бесконечного ожидания, а очередь остаётся доступной остальным.
+# Проверка и постановка выполняются одним шагом в цикле событий, поэтому
+# два быстрых нажатия не проходят проверку оба.
+# Использование квоты записывается в данные пользователя (поле
+# llm_quota) и видно в списке пользователей у администратора
+import math  # Округление ожидания вверх
+import threading  # Вёдра используются из потоков обработчиков
+import time  # Дата для счётчика за день
+from functools import partial  # Проверка допуска для очереди
+import llm_jobs  # Очередь генераций (длина и оценка ожидания)
+import user_store  # Учёт квоты в данных пользователя
+from ratelimit import TokenBucket  # Ведро токенов
+
+RATE = 1 / 20  # Запросов в секунду на пользователя (в среднем раз в 20 секунд)
+BURST = 3  # Сколько запросов пользователь может сделать подряд
+USER_JOBS = 2  # Сколько генераций одного пользователя может ждать и выполняться
+MAX_QUEUE = 100  # Наибольшая длина общей очереди генераций
+MAX_BUCKETS = 10000  # Сколько вёдер держать до чистки
+
+_buckets = {}  # {user_id: TokenBucket}
+_lock = threading.Lock()  # Защищает _buckets и счётчики
+counters = {'admitted': 0, 'rejected_rate': 0, 'rejected_busy': 0, 'rejected_queue': 0}
+
+
+def _bucket(user_id):
+    """Ведро пользователя (вызывается под _lock)"""
+    bucket = _buckets.get(user_id)
+    if bucket is None:
+        if len(_buckets) >= MAX_BUCKETS:
+            # Полные вёдра ничего не помнят - их можно забыть
+            for key in [key for key, old in _buckets.items() if old.idle()]:
+                del _buckets[key]
+        bucket = _buckets[user_id] = TokenBucket(RATE, BURST)
+    return bucket
+
+
+def enqueue(user_id, chat_id, work, on_status=None, on_failed=None):
+    """Допуск и постановка генерации в очередь (см. llm_jobs.enqueue):
+    0 - задание в очереди, иначе через сколько секунд попробовать снова"""
+    user_id = str(user_id)
+    wait = llm_jobs.enqueue(chat_id, work, on_status, on_failed, admit=partial(_admit, user_id)).result()
+    _record(user_id, wait == 0)
+    return wait
+
+
+def _admit(user_id, chat_id):
+    """Проверка допуска (в цикле событий, перед постановкой в очередь)"""
+    with _lock:
+        if llm_jobs.queued() >= MAX_QUEUE:
+            reason, wait = 'rejected_queue', llm_jobs.wait_estimate(llm_jobs.queued() - MAX_QUEUE + 1)
+        elif llm_jobs.chat_jobs(chat_id) >= USER_JOBS:
+            reason, wait = 'rejected_busy', llm_jobs.wait_estimate()
+        else:
+            bucket = _bucket(user_id)
+            if bucket.take():
+                reason, wait = 'admitted', 0
+            else:
+                reason, wait = 'rejected_rate', max(1, math.ceil(bucket.delay()))
+        counters[reason] += 1
+    return wait
+
+
+def refusal(wait):
+    """Текст отказа для пользователя"""
+    return f"⏳ Слишком много запросов к GigaChat, попробуйте через {wait} с"
+
+
+def _record(user_id, admitted):
+    """Учёт квоты в данных пользователя: запросы за день, всего и отказы"""
+    if not user_store.is_registered(user_id):
+        return
+    today = time.strftime('%Y-%m-%d')
+    with user_store.transaction(user_id) as user:
+        quota = dict(user.get('llm_quota') or {})
+        if quota.get('day') != today:
+            quota['day'], quota['today'] = today, 0
+        if admitted:
+            quota['today'] += 1
+            quota['total'] = quota.get('total', 0) + 1
+        else:
+            quota['rejected'] = quota.get('rejected', 0) + 1
+        quota['last'] = int(time.time())
+        user['llm_quota'] = quota
+
+
+def stats():
+    """Счётчики допуска и число вёдер пользователей"""
+    with _lock:
+        return {**counters, 'users': len(_buckets)}
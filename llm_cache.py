@@ -0,0 +1,182 @@
+# Кэш ответов GigaChat
+# Ключ - хэш нормализованного текста запроса вместе с моделью и
+# настройками генерации. Два уровня: LRU в памяти и база SQLite на
+# диске, которая переживает перезапуск. У записей есть срок жизни
+# (TTL), база ограничена по размеру - при превышении удаляются давно
+# не использованные ответы. Счётчики попаданий видны администратору.
+# Кэш вызывается из цикла async_runtime: память проверяется сразу, а
+# запросы к SQLite идут в пуле потоков и не задерживают остальные
+# генерации
+import hashlib  # Ключ кэша
+import json  # Ключ из модели и настроек
+import sqlite3  # Дисковый уровень
+import threading  # Кэш используется из разных потоков
+import time  # Срок жизни записей
+from collections import OrderedDict  # LRU в памяти
+from async_runtime import run_sync  # Дисковый уровень вне цикла событий
+
+DB_FILE = 'llm_cache.db'  # Файл дискового уровня
+TTL = 7 * 24 * 3600  # Срок жизни ответа, секунд
+MEMORY_ITEMS = 512  # Ответов в памяти
+DISK_BYTES = 50 * 1024 * 1024  # Наибольший объём ответов на диске, байт
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+"""
+SQL_GET = 'SELECT response, created FROM responses WHERE key = ?'
+SQL_GET_SIZE = 'SELECT size FROM responses WHERE key = ?'
+SQL_TOUCH = 'UPDATE responses SET used = ? WHERE key = ?'
+SQL_PUT = 'INSERT OR REPLACE INTO responses (key, response, created, used, size) VALUES (?, ?, ?, ?, ?)'
+SQL_DELETE = 'DELETE FROM responses WHERE key = ?'
+SQL_EXPIRE = 'DELETE FROM responses WHERE created < ?'
+SQL_SIZE = 'SELECT COALESCE(SUM(size), 0) FROM responses'
+SQL_OLDEST = 'SELECT key, size FROM responses WHERE key != ? ORDER BY used LIMIT 1'
+
+_memory = OrderedDict()  # {ключ: (ответ, время создания)}
+_lock = threading.Lock()  # Защищает память и счётчики (держится недолго)
+_db_lock = threading.Lock()  # Защищает соединение и объём диска
+_conn = None  # Соединение с базой
+_disk_bytes = None  # Текущий объём ответов на диске
+counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+
+def normalize(prompt):
+    """Нормализация запроса: регистр и пробелы не влияют на ключ"""
+    return ' '.join(prompt.split()).casefold()
+
+
+def make_key(prompt, model, settings=None):
+    """Ключ кэша для запроса, модели и настроек генерации"""
+    raw = json.dumps([normalize(prompt), model, settings or {}], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _db():
+    """Соединение с базой (вызывается под _db_lock)"""
+    global _conn, _disk_bytes
+    if _conn is None:
+        _conn = sqlite3.connect(DB_FILE, check_same_thread=False)
+        _conn.execute('PRAGMA journal_mode=WAL')
+        _conn.execute('PRAGMA synchronous=NORMAL')
+        _conn.executescript(SCHEMA)
+        _conn.execute(SQL_EXPIRE, (time.time() - TTL,))
+        _conn.commit()
+        _disk_bytes = _conn.execute(SQL_SIZE).fetchone()[0]
+    return _conn
+
+
+def _remember(key, response, created):
+    """Запись в LRU памяти (вызывается под _lock)"""
+    _memory[key] = (response, created)
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_ITEMS:
+        _memory.popitem(last=False)
+
+
+def _get_memory(key, now):
+    """Ответ из памяти или None"""
+    with _lock:
+        item = _memory.get(key)
+        if item is not None and item[1] >= now - TTL:
+            _memory.move_to_end(key)
+            counters['memory_hits'] += 1
+            return item[0]
+        _memory.pop(key, None)
+        return None
+
+
+def _get_disk(key, now):
+    """Ответ с диска (с переносом в память) или None"""
+    with _db_lock:
+        conn = _db()
+        row = conn.execute(SQL_GET, (key,)).fetchone()
+        if row is not None and row[1] >= now - TTL:
+            conn.execute(SQL_TOUCH, (now, key))
+            conn.commit()
+    with _lock:
+        if row is None or row[1] < now - TTL:
+            counters['misses'] += 1
+            return None
+        _remember(key, row[0], row[1])
+        counters['disk_hits'] += 1
+        return row[0]
+
+
+async def get(key):
+    """Ответ из кэша или None"""
+    now = time.time()
+    response = _get_memory(key, now)
+    return response if response is not None else await run_sync(_get_disk, key, now)
+
+
+def _put_disk(key, response, now):
+    """Запись ответа на диск с вытеснением старых"""
+    global _disk_bytes
+    size = len(response.encode('utf-8'))
+    evicted = []
+    with _db_lock:
+        conn = _db()
+        old = conn.execute(SQL_GET_SIZE, (key,)).fetchone()
+        conn.execute(SQL_PUT, (key, response, now, now, size))
+        _disk_bytes += size - (old[0] if old else 0)
+        # Вытеснение давно не использованных ответов при превышении объёма
+        while _disk_bytes > DISK_BYTES:
+            oldest = conn.execute(SQL_OLDEST, (key,)).fetchone()
+            if oldest is None:
+                break
+            conn.execute(SQL_DELETE, (oldest[0],))
+            evicted.append(oldest[0])
+            _disk_bytes -= oldest[1]
+        conn.commit()
+    with _lock:
+        for old_key in evicted:
+            _memory.pop(old_key, None)
+        counters['evictions'] += len(evicted)
+        counters['stores'] += 1
+
+
+async def put(key, response):
+    """Сохранение ответа в обоих уровнях"""
+    now = time.time()
+    with _lock:
+        _remember(key, response, now)
+    await run_sync(_put_disk, key, response, now)
+
+
+def _forget_disk(key):
+    """Удаление ответа с диска"""
+    global _disk_bytes
+    with _db_lock:
+        conn = _db()
+        row = conn.execute(SQL_GET_SIZE, (key,)).fetchone()
+        if row:
+            conn.execute(SQL_DELETE, (key,))
+            conn.commit()
+            _disk_bytes -= row[0]
+
+
+async def forget(key):
+    """Удаление ответа (например, его не удалось разобрать)"""
+    with _lock:
+        _memory.pop(key, None)
+    await run_sync(_forget_disk, key)
+
+
+def stats():
+    """Счётчики и размеры кэша"""
+    with _lock:
+        lookups = counters['memory_hits'] + counters['disk_hits'] + counters['misses']
+        hits = counters['memory_hits'] + counters['disk_hits']
+        return {
+            **counters,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'memory_items': len(_memory),
+            'disk_bytes': _disk_bytes or 0
+        }
@@ -0,0 +1,196 @@
+# Очередь генераций GigaChat
+# Генерации выполняются фиксированным числом воркеров в цикле
+# async_runtime, остальные ждут в очереди - зависший GigaChat занимает
+# только воркеры генераций, а меню и остальные обработчики работают.
+# У задания есть срок (DEADLINE секунд с начала выполнения), неудачная
+# попытка повторяется с экспоненциальной паузой. Задания разных чатов
+# выдаются воркерам по кругу, поэтому один чат с десятком запросов не
+# задерживает остальных. Пользователь видит своё место в очереди и может
+# отменить генерацию кнопкой "Отмена"
+import asyncio  # Воркеры в цикле событий
+import math  # Оценка ожидания
+import random  # Разброс пауз перед повтором
+import time  # Срок задания
+from collections import OrderedDict, deque  # Очереди чатов по кругу
+from async_runtime import submit  # Вызовы из потоков обработчиков
+
+WORKERS = 8  # Одновременно выполняемых генераций
+DEADLINE = 120  # Срок задания с начала выполнения, секунд
+RETRIES = 2  # Повторов после неудачной попытки
+BACKOFF = 2.0  # Пауза перед первым повтором, секунд (дальше удваивается)
+
+_pending = OrderedDict()  # Ждущие задания {chat_id: deque}, чаты обслуживаются по кругу
+_available = asyncio.Semaphore(0)  # Сколько заданий поставлено в очередь
+_running = set()  # Выполняемые задания
+_workers = []  # Задачи воркеров
+_average = 20.0  # Средняя длительность задания, секунд (для оценки ожидания)
+counters = {'done': 0, 'retries': 0, 'timeouts': 0, 'failed': 0, 'cancelled': 0}
+
+
+class _Job:
+    """Задание: генерация для одного чата"""
+    __slots__ = ('chat_id', 'work', 'on_status', 'on_failed', 'task', 'cancelled')
+
+    def __init__(self, chat_id, work, on_status, on_failed):
+        self.chat_id = str(chat_id)
+        self.work = work  # Корутинная функция одной попытки
+        self.on_status = on_status  # async (текст) - показ состояния пользователю
+        self.on_failed = on_failed  # async () - после окончательной ошибки
+        self.task = None  # Текущая попытка
+        self.cancelled = False
+
+
+async def _call(callback, *args):
+    """Вызов обработчика задания; его ошибка не останавливает воркер"""
+    if callback is None:
+        return
+    try:
+        await callback(*args)
+    except Exception as e:
+        print(f"Ошибка обработчика задания генерации: {e!r}")
+
+
+def enqueue(chat_id, work, on_status=None, on_failed=None, admit=None):
+    """Постановка генерации в очередь (из любого потока)
+
+    work - корутинная функция без аргументов, вызывается на каждую попытку
+    и при ошибке бросает исключение. on_status(текст) показывает место в
+    очереди, повторы и ошибку, on_failed() вызывается после последней
+    неудачной попытки. admit(chat_id) - проверка допуска, выполняется в
+    цикле событий вместе с постановкой (между ними очередь не меняется) и
+    возвращает 0 или через сколько секунд попробовать снова.
+    Возвращает future с результатом admit (0 - задание в очереди)
+    """
+    return submit(_enqueue(_Job(chat_id, work, on_status, on_failed), admit))
+
+
+async def _enqueue(job, admit=None):
+    """Постановка задания в очередь (в цикле событий)"""
+    if admit is not None:
+        wait = admit(job.chat_id)
+        if wait:
+            return wait
+    while len(_workers) < WORKERS:
+        _workers.append(asyncio.create_task(_worker()))
+    # Место среди заданий, которым не хватило свободного воркера: по кругу
+    # раньше пройдут столько же заданий каждого другого чата, сколько уже
+    # ждёт у этого, и ещё по одному
+    turn = len(_pending.get(job.chat_id, ())) + 1
+    ahead = sum(min(len(jobs), turn) for chat_id, jobs in _pending.items() if chat_id != job.chat_id)
+    position = ahead + turn + len(_running) - WORKERS
+    _pending.setdefault(job.chat_id, deque()).append(job)
+    _available.release()
+    if position > 0:
+        # Сообщение о месте в очереди не задерживает ответ вызывающему
+        asyncio.create_task(_call(job.on_status, f'⏳ Запрос в очереди, место: {position}'))
+    return 0
+
+
+def cancel(chat_id):
+    """Отмена ждущих и выполняемых генераций чата; True, если было что отменять"""
+    return submit(_cancel(str(chat_id))).result()
+
+
+async def _cancel(chat_id):
+    """Отмена генераций чата (в цикле событий)"""
+    jobs = [*_pending.pop(chat_id, ()), *(job for job in _running if job.chat_id == chat_id)]
+    jobs = [job for job in jobs if not job.cancelled]
+    for job in jobs:
+        job.cancelled = True
+        if job.task is not None:
+            job.task.cancel()
+        counters['cancelled'] += 1
+    return bool(jobs)
+
+
+def _next():
+    """Следующее задание: из чата, который дольше всех ждёт своей очереди"""
+    while _pending:
+        chat_id, jobs = next(iter(_pending.items()))
+        job = jobs.popleft()
+        if jobs:
+            _pending.move_to_end(chat_id)
+        else:
+            del _pending[chat_id]
+        if not job.cancelled:
+            return job
+    return None
+
+
+async def _worker():
+    """Воркер: выполнение заданий из очереди по одному"""
+    global _average
+    while True:
+        await _available.acquire()
+        job = _next()
+        if job is None:
+            continue  # Задание отменено, пока ждало
+        _running.add(job)
+        started = time.monotonic()
+        try:
+            await _run(job)
+        except Exception as e:
+            print(f"Ошибка задания генерации: {e!r}")
+        finally:
+            _running.discard(job)
+            _average += (time.monotonic() - started - _average) * 0.1
+
+
+async def _run(job):
+    """Попытки задания с повтором после ошибки, пока не истёк срок"""
+    deadline = time.monotonic() + DEADLINE
+    for attempt in range(RETRIES + 1):
+        job.task = asyncio.create_task(job.work())
+        done, _ = await asyncio.wait({job.task}, timeout=max(0.0, deadline - time.monotonic()))
+        if job.cancelled or job.task.cancelled():
+            return
+        if not done:
+            # Срок вышел - повторять некогда
+            job.task.cancel()
+            counters['timeouts'] += 1
+            print(f"Генерация для чата {job.chat_id} не уложилась в {DEADLINE} с")
+            await _call(job.on_status, 'GigaChat не ответил вовремя, попробуйте позже')
+            break
+        error = job.task.exception()
+        if error is None:
+            counters['done'] += 1
+            return
+        print(f"Ошибка генерации для чата {job.chat_id} (попытка {attempt + 1}): {error!r}")
+        delay = BACKOFF * 2 ** attempt * random.uniform(0.8, 1.2)
+        if attempt == RETRIES or time.monotonic() + delay >= deadline:
+            await _call(job.on_status, 'Ошибка при обращении к GigaChat, попробуйте позже')
+            break
+        counters['retries'] += 1
+        await _call(job.on_status, f'⚠️ GigaChat не ответил, повтор через {delay:.0f} с...')
+        await asyncio.sleep(delay)
+        if job.cancelled:
+            return
+    counters['failed'] += 1
+    await _call(job.on_failed)
+
+
+def queued():
+    """Число ждущих заданий (в цикле событий)"""
+    return sum(len(jobs) for jobs in _pending.values())
+
+
+def chat_jobs(chat_id):
+    """Число ждущих и выполняемых заданий чата (в цикле событий)"""
+    chat_id = str(chat_id)
+    return len(_pending.get(chat_id, ())) + sum(1 for job in _running if job.chat_id == chat_id)
+
+
+def wait_estimate(jobs=None):
+    """Примерное ожидание, пока освободится место для jobs заданий, секунд
+    (в цикле событий)"""
+    jobs = queued() + 1 if jobs is None else jobs
+    return max(1, math.ceil(jobs / WORKERS * _average))
+
+
+def stats():
+    """Длина очереди, число выполняемых заданий и счётчики (из любого потока)"""
+    return submit(_stats()).result()
+
+
+async def _stats():
+    return {'queued': queued(), 'running': len(_running), 'average': _average, **counters}
@@ -1,54 +1,113 @@
 # Импорт необходимых библиотек
 import telebot  # Основная библиотека для работы с Telegram API
 from telebot import types  # Типы данных для создания кнопок и элементов интерфейса
-from request import gpt_request  # Кастомный модуль для запросов к GPT (GigaChat)
+from request import gpt_stream_async, aclose as close_gigachat  # Кастомный модуль для запросов к GPT (GigaChat)
+from async_runtime import submit  # Общий цикл asyncio для генераций
+from functools import partial  # Задания очереди генераций
+from contextlib import aclosing  # Генерация прерывается вместе с заданием
 from config import *  # Импорт всех переменных из config.py (вероятно содержит настройки)
-import pickle  # Для сериализации/десериализации данных
-import os  # Для работы с файловой системой
 from mathgenerator import mathgen  # Генератор математических задач
 import random  # Генерация случайных чисел
-from learn import init_learning_module, start_learning_session,learning_sessions, send_question_gpt
-
-# Функция загрузки данных пользователей из файла
-def load_user_data(): 
-    # Проверка существования файла с данными
-    if os.path.exists('user_data.pkl'):
-        # Открытие файла в бинарном режиме чтения
-        with open('user_data.pkl', 'rb') as f:
-            return pickle.load(f)  # Десериализация данных
-    return {}  # Возврат пустого словаря если файла нет
-
-# Функция сохранения данных пользователей в файл
-def save_user_data(data):
-    # Открытие файла в бинарном режиме записи
-    with open('user_data.pkl','wb') as f:
-        pickle.dump(data, f)  # Сериализация данных
+from learn import init_learning_module, start_learning_session, cleanup_session, handle_test_answer
+import user_store  # Общее хранилище данных пользователей
+from export import send_users_export, users_page_text  # Выгрузка пользователей для администратора
+from webhook import run_webhook  # Приём обновлений через webhook
+from scheduler import ChatOrderedTeleBot  # Порядок внутри чата, параллельность между чатами
+import outbox  # Очередь исходящих вызовов с ограничением частоты
+import state  # Общее состояние диалогов (память или Redis)
+import state_snapshot  # Снимок состояния для тёплого перезапуска
+import file_cache  # Кэш file_id отправленных файлов
+import lesson_catalog  # Каталог файлов уроков
+import lesson_convert  # Тексты уроков из .docx
+import photo_store  # Фото, присланные пользователями
+import image_variants  # Уменьшенные варианты картинок
+import llm_cache  # Кэш ответов GigaChat
+import llm_jobs  # Очередь генераций GigaChat
+import llm_admission  # Допуск запросов к GigaChat
+import material_bank  # Готовые материалы по темам
+from state import StateDict, StateHandlerBackend
+from live_message import LiveMessage  # Сообщение, дописываемое по мере генерации
 
 # Проверка регистрации пользователя по ID
 def is_user_registered(user_id): 
-    user_data = load_user_data()
-    # Преобразование user_id в строку и проверка наличия в ключах словаря
-    if str(user_id) in list(user_data.keys()):
-        return True
-    else:
-        return False
+    return user_store.is_registered(user_id)
 
 # Обработчик запросов к GigaChat
 def giga(message):
-    # Отправка ответа от GPT напрямую в чат
-    bot.send_message(message.chat.id, gpt_request(message.text))
+    # Генерация ставится в очередь генераций, поток обработчика сразу свободен;
+    # слишком частые запросы сразу получают отказ с временем ожидания
+    live = LiveMessage(bot, message.chat.id, interval=stream_edit_interval)
+    wait = llm_admission.enqueue(message.from_user.id, message.chat.id,
+                                 partial(answer_giga, live, message.text), on_status=live.status)
+    if wait:
+        bot.reply_to(message, llm_admission.refusal(wait))
     return
 
+# Получение ответа GigaChat (одна попытка задания очереди): текст
+# дописывается в сообщение по мере генерации
+async def answer_giga(live, text):
+    await live.status('✍️ GigaChat печатает...')
+    answer = ''
+    async with aclosing(gpt_stream_async(text)) as stream:
+        async for piece in stream:
+            answer += piece
+            await live.update(answer.strip())
+    # Окончательный текст ответа
+    await live.update(answer.strip() or 'GigaChat не дал ответа', final=True)
+
 # Инициализация бота с токеном из файла
 # ГЛОБАЛЬНЫЕ ПЕРЕМЕННЫЕ (создаются здесь впервые)
-bot = telebot.TeleBot(open('api.txt').read())
+if telegram_api_url:
+    telebot.apihelper.API_URL = telegram_api_url  # Локальная заглушка Bot API
+if telegram_file_url:
+    telebot.apihelper.FILE_URL = telegram_file_url  # Скачивание файлов с заглушки
+photo_store.MAX_SIZE = photo_max_size
+image_variants.MIN_SIDE = image_min_side
+llm_cache.DB_FILE = llm_cache_file
+llm_cache.TTL = llm_cache_ttl
+llm_cache.MEMORY_ITEMS = llm_cache_memory_items
+llm_cache.DISK_BYTES = llm_cache_disk_bytes
+llm_jobs.WORKERS = llm_workers
+llm_jobs.DEADLINE = llm_job_deadline
+llm_jobs.RETRIES = llm_job_retries
+llm_jobs.BACKOFF = llm_retry_backoff
+llm_admission.RATE = llm_user_rate
+llm_admission.BURST = llm_user_burst
+llm_admission.USER_JOBS = llm_user_jobs
+llm_admission.MAX_QUEUE = llm_queue_limit
+# Обновления одного чата идут по порядку (важно для register_next_step_handler
+# и счётчиков user_progres), разные чаты обрабатываются параллельно
+# Состояние диалогов и обработчики следующего шага хранятся в общем хранилище,
+# поэтому за одним webhook может работать несколько процессов бота
+state.init(state_backend, redis_url)
+bot = ChatOrderedTeleBot(
+    open('api.txt').read(), lanes=num_threads, lane_queue_size=lane_queue_size,
+    next_step_backend=StateHandlerBackend()
+)
 init_learning_module(bot) 
-# Глобальная переменная для отслеживания прогресса пользователей в активностях
-user_progres = {}
+# Все вызовы Bot API идут через очередь с ограничениями Telegram
+outbox.install(outbox_global_rate, outbox_chat_rate, outbox_chat_burst, outbox_workers)
+# Подключение хранилища пользователей (выбирается в config.py)
+user_store.init()
+# Файлы, уже загруженные в Telegram, отправляются по file_id
+file_cache.load(file_cache_file)
+material_bank.load(material_bank_file)
+# Каталог уроков строится один раз и обновляется при изменении папок
+lesson_catalog.start(lessons, lesson_catalog_poll)
+# Документы уроков разбираются на сообщения в фоне, заранее
+lesson_convert.start(lesson_catalog)
+# Картинки уроков и расписание заранее пережимаются для быстрой загрузки
+image_variants.start(lesson_catalog, extra=['raspisanie_23.jpg'])
+# Прогресс пользователей в активностях: {user_id: [вопрос, правильные, ID_сообщения]}
+# Значения - копии из хранилища, изменённый список нужно записать обратно
+user_progres = StateDict('user_progres')
 # Уровни сложности математических задач (ID генераторов)
 math_levels = [[1,2],[3,4],[5,6]]
-# Список для хранения вопросов теста
-questions = []
+# Вопросы текущего теста каждого пользователя: {user_id: [строки вопросов]}
+test_questions = StateDict('test_questions')
+# Восстановление незавершённых тестов и сессий после перезапуска
+if state_snapshot_file:
+    state_snapshot.start(state_snapshot_file, state_snapshot_interval)
 # Список ID администраторов
 admin_id = ['1075906814'] 
 
@@ -75,16 +134,13 @@ def math_game(message):
         return
     
     user_id = str(message.from_user.id)
-    # Глобальная переменная для отслеживания прогресса
-    global user_progres
     # Инициализация прогресса: [текущий_вопрос, правильные_ответы, ID_сообщения]
     user_progres[user_id] = [0,0,'']
     
     # Создание inline-клавиатуры (кнопки под сообщением)
     markup_line = types.InlineKeyboardMarkup()
     # Загрузка уровня математики пользователя
-    user_data = load_user_data()
-    level_math = user_data[user_id]['level_math']
+    level_math = user_store.get_field(user_id, 'level_math')
     
     # Генерация случайной задачи из доступного уровня
     problem, answer = mathgen.genById(
@@ -118,7 +174,9 @@ def math_game(message):
     # Отправка задачи с кнопками
     msg = bot.send_message(user_id, f'Решите пример {problem}', reply_markup=markup_line)
     # Сохранение ID сообщения для последующего редактирования
-    user_progres[user_id][2] = msg.message_id
+    progress = user_progres[user_id]
+    progress[2] = msg.message_id
+    user_progres[user_id] = progress
 
 # Выбор урока для изучения
 def lesson_selection(message):
@@ -127,47 +185,68 @@ def lesson_selection(message):
         return
     
     lesson = message.text  # Название урока из кнопки
-    # Получение пути к папке урока из словаря lessons (config)
-    lesson_folder = lessons[lesson] 
+    # Урок должен быть в словаре lessons (config)
+    if lesson not in lessons:
+        bot.send_message(message.chat.id, 'Такого урока нет')
+        show_menu(message)
+        return
     try:
-        # Отправка материалов урока
-        send_materials(message, lesson_folder)
+        # Отправка материалов урока (массовая отправка, уступает ответам)
+        with outbox.bulk():
+            send_materials(message, lesson)
         bot.send_message(message.chat.id, f'Файлы урока {lesson} успешно отправлены')
     except BaseException:  # Ловим любые ошибки
         bot.send_message(message.chat.id, 'Ошибка при отправке файлов')
     show_menu(message)
 
 # Отправка учебных материалов разных типов
-def send_materials(message, folder_path):
-    # Перебор всех файлов в указанной папке
-    for filename in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, filename)
-        print(file_path)  # Отладочный вывод
-        
-        # Обработка текстовых файлов
-        if filename.endswith('.txt'):
-            with open(file_path, 'r', encoding='utf-8') as file:
-                bot.send_message(message.from_user.id, f"Текст урока {file.read()}")
-        
-        # Обработка изображений
-        elif filename.endswith(('.jpg','.jpeg','.png')):
-            with open(file_path, 'rb') as photo:
-                bot.send_photo(message.from_user.id, photo)
-        
-        # Обработка видео
-        elif filename.endswith(('.mp4','.mov')):
-            with open(file_path, 'rb') as video:
-                bot.send_video(message.from_user.id, video)
-        
-        # Обработка PDF
-        elif filename.endswith('.pdf'):
-            with open(file_path, 'rb') as pdf:
-                bot.send_document(message.from_user.id, pdf, caption='Учебный файл')
-        
-        # Обработка аудио
-        elif filename.endswith('.mp3'):
-            with open(file_path, 'rb') as audio:
-                bot.send_document(message.from_user.id, audio, caption='Аудио файл')
+def send_materials(message, lesson):
+    user_id = message.from_user.id
+    texts = []  # Тексты урока
+    visual = []  # Фото и видео - один альбом
+    documents = []  # PDF и аудио (отправляются документами) - другой альбом
+    # Разбор файлов урока из каталога (без обращения к диску)
+    for item in lesson_catalog.manifest(lesson):
+        signature = (item.size, item.mtime)
+        if item.kind == 'text':
+            texts.append(f"Текст урока {item.text}")
+        elif item.kind == 'docx':
+            # Готовый текст документа (пока не разобран - пропускается)
+            texts.extend(lesson_convert.chunks(item) or [])
+        elif item.kind in ('photo', 'video'):
+            visual.append((item.kind, item.path, signature, None))
+        elif item.kind == 'pdf':
+            # PDF отправляется только файлом, без копии текста сообщениями
+            documents.append(('document', item.path, signature, 'Учебный файл'))
+        elif item.kind == 'audio':
+            documents.append(('document', item.path, signature, 'Аудио файл'))
+    
+    # Тексты склеиваются в как можно меньшее число сообщений
+    for part in pack_texts(texts):
+        bot.send_message(user_id, part)
+    
+    # Файлы уходят альбомами по 10 штук
+    for group in (visual, documents):
+        for i in range(0, len(group), file_cache.ALBUM_SIZE):
+            file_cache.send_album(bot, user_id, group[i:i + file_cache.ALBUM_SIZE])
+
+# Склейка текстов в сообщения не длиннее limit символов
+def pack_texts(texts, limit=4000):
+    parts = []
+    current = ''
+    for text in texts:
+        # Слишком длинный текст режется на куски
+        for i in range(0, len(text), limit):
+            piece = text[i:i + limit]
+            if current and len(current) + 2 + len(piece) <= limit:
+                current += '\n\n' + piece
+            else:
+                if current:
+                    parts.append(current)
+                current = piece
+    if current:
+        parts.append(current)
+    return parts
 
 # Запуск тестирования
 def test_mode(message):
@@ -175,8 +254,6 @@ def test_mode(message):
         show_menu(message)
         return
     
-    # Глобальные переменные для вопросов и прогресса
-    global questions, user_progres
     user_id = str(message.from_user.id)
     # Инициализация прогресса: [номер_вопроса, правильные_ответы, ID_сообщения]
     user_progres[user_id] = [0,0,'']
@@ -192,13 +269,14 @@ def test_mode(message):
     try:
         # Загрузка вопросов из файла (формат: test_<номер>.txt)
         questions = open('test_'+str(message.text)+'.txt','r',encoding='utf-8').readlines()
+        test_questions[user_id] = questions
     except BaseException:
         bot.send_message(user_id,'Ошибка чтения файла')
         show_menu(message)
         return
     
     # Отправка первого вопроса
-    send_question(message, questions[user_progres[user_id][0]])
+    send_question(message, questions[0])
 
 # Отправка вопроса теста
 def send_question(message, question):
@@ -207,24 +285,26 @@ def send_question(message, question):
     # Формат: "Вопрос?_ответ1_ответ2_ответ3_ответ4_индекс_правильного"
     parts = question.split('_')
     user_id = str(message.from_user.id)
+    progress = user_progres[user_id]
     
     # Создание кнопок для вариантов ответа (исключаем первый и последний элементы)
     for i, answer in enumerate(parts[1:-1]):
         btn = types.InlineKeyboardButton(
             text = answer,
             # Формат: answer_<номер_вопроса>_<выбранный_ответ>_<правильный_ответ>
-            callback_data=f'answer_{user_progres[user_id][0]}_{i}_{parts[-1]}'
+            callback_data=f'answer_{progress[0]}_{i}_{parts[-1]}'
         )
         markup.add(btn)
     
     # Отправка вопроса с кнопками
     msg = bot.send_message(
         user_id, 
-        f'{user_progres[user_id][0]+1}. Вопрос {parts[0]}', 
+        f'{progress[0]+1}. Вопрос {parts[0]}', 
         reply_markup=markup
     )
     # Сохранение ID сообщения для редактирования
-    user_progres[user_id][2] = msg.message_id    
+    progress[2] = msg.message_id
+    user_progres[user_id] = progress
 
 # Обработчик ответов на тест
 @bot.callback_query_handler(func=lambda call: call.data.startswith("answer_"))
@@ -232,46 +312,78 @@ def handle_answer(message):
     # Разбор callback_data
     _, ques, answ, corr = message.data.split('_')
     user_id = str(message.from_user.id)
+    progress = user_progres[user_id]
+    questions = test_questions[user_id]
     
     # Редактирование сообщения с вопросом (убираем кнопки)
     bot.edit_message_text(
         chat_id=user_id,
-        message_id=user_progres[user_id][2],
+        message_id=progress[2],
         text=f'{ques} \nНомер ответа - {int(answ)+1}',
         reply_markup=None
     )
     
     # Обновление счетчика вопросов
-    user_progres[user_id][0] += 1
+    progress[0] += 1
     
     # Проверка правильности ответа
     if int(answ) == int(corr)-1:
-        user_progres[user_id][1] += 1
+        progress[1] += 1
+    user_progres[user_id] = progress
     
     # Проверка завершения теста
-    if user_progres[user_id][0] != len(questions):
+    if progress[0] != len(questions):
         bot.send_message(user_id, 'Следующий вопрос')
-        send_question(message, questions[user_progres[user_id][0]])
+        send_question(message, questions[progress[0]])
     else:
         bot.send_message(user_id, 'Тест завершён!')
+        del test_questions[user_id]  # Вопросы пройденного теста больше не нужны
         # Расчет результатов
-        correct = user_progres[user_id][1]
+        correct = progress[1]
         total = len(questions)
         bot.send_message(user_id, f'Ты правильно ответил на {correct} из {total} вопросов')
         
         # Обновление уровня пользователя
-        user_data = load_user_data()
         score = round(correct * 100 / total, 2)
         
         if score >= 60:
-            user_data[user_id]['level'] += 1
+            with user_store.transaction(user_id) as user:
+                user['level'] += 1
             bot.send_message(user_id, 'Вы прошли тест по этому модулю')
         else:
             bot.send_message(user_id, 'Вы не прошли тест, попробуйте снова')
         
-        save_user_data(user_data)
         show_menu(message)
 
+# Страница списка пользователей для администратора
+def show_users_page(chat_id, page, message_id=None):
+    text, page, pages = users_page_text(page, users_page_size)
+    
+    # Кнопки листания страниц
+    markup = types.InlineKeyboardMarkup()
+    buttons = []
+    if page > 0:
+        buttons.append(types.InlineKeyboardButton('◀', callback_data=f'userspage_{page-1}'))
+    if page < pages - 1:
+        buttons.append(types.InlineKeyboardButton('▶', callback_data=f'userspage_{page+1}'))
+    if buttons:
+        markup.row(*buttons)
+    
+    # Новая страница - новое сообщение, листание - правка старого
+    if message_id is None:
+        bot.send_message(chat_id, text, reply_markup=markup)
+    else:
+        bot.edit_message_text(text, chat_id=chat_id, message_id=message_id, reply_markup=markup)
+
+# Обработчик листания списка пользователей
+@bot.callback_query_handler(func=lambda call: call.data.startswith('userspage_'))
+def users_page(call):
+    if str(call.from_user.id) not in admin_id:
+        return
+    page = int(call.data.split('_')[1])
+    show_users_page(call.message.chat.id, page, call.message.message_id)
+    bot.answer_callback_query(call.id)
+
 # Обработчик ответов в математической игре
 @bot.callback_query_handler(func=lambda call: call.data.startswith('math_'))
 def math_answer(message):
@@ -287,19 +399,19 @@ def math_answer(message):
         reply_markup=None
     )
     
-    # Загрузка данных пользователя
-    user_data = load_user_data()
+    # Изменение данных пользователя в транзакции (без гонок между потоками)
+    with user_store.transaction(user_id) as user:
+        if corr == answ:
+            # Обновление счета
+            user['score_math'] += 1
+            
+            # Повышение уровня после 5 правильных ответов
+            if user['score_math'] >= 5:
+                if user['level_math'] < 2:
+                    user['level_math'] += 1 
+                user['score_math'] = 0  # Сброс счетчика
+    
     if corr == answ:
-        # Обновление счета
-        user_data[user_id]['score_math'] += 1
-        
-        # Повышение уровня после 5 правильных ответов
-        if user_data[user_id]['score_math'] >= 5:
-            if user_data[user_id]['level_math'] < 2:
-                user_data[user_id]['level_math'] += 1 
-            user_data[user_id]['score_math'] = 0  # Сброс счетчика
-        
-        save_user_data(user_data)
         bot.send_message(user_id,'Правильно!')
     else:
         bot.send_message(user_id,'Не правильно!')
@@ -307,8 +419,8 @@ def math_answer(message):
     # Статистика и предложение повторить
     msg = bot.send_message(
         user_id,
-        f'Начать снова? Ваши очки - {user_data[user_id]["score_math"]}, '
-        f'ваш уровень - {user_data[user_id]["level_math"]}'
+        f'Начать снова? Ваши очки - {user["score_math"]}, '
+        f'ваш уровень - {user["level_math"]}'
     )
     bot.register_next_step_handler(msg, math_game)
 
@@ -358,17 +470,14 @@ def handle_contact(message):
     user_id = str(message.from_user.id)
     phone = message.contact.phone_number  # Извлечение номера
     
-    user_data = load_user_data()
-    if user_id not in user_data:
-        user_data[user_id] = {}  # Создание записи для нового пользователя
-    
-    # Сохранение данных
-    user_data[user_id]['phone'] = phone
-    user_data[user_id]['level_math'] = 0  # Начальный уровень математики
-    user_data[user_id]['score_math'] = 0  # Счетчик правильных ответов
-    user_data[user_id]['level'] = 0  # Уровень пройденных уроков
-    
-    save_user_data(user_data)
+    # Сохранение данных (запись создаётся для нового пользователя)
+    user_store.set_fields(
+        user_id,
+        phone=phone,
+        level_math=0,  # Начальный уровень математики
+        score_math=0,  # Счетчик правильных ответов
+        level=0  # Уровень пройденных уроков
+    )
     bot.send_message(message.chat.id,'Вы зарегестрированы')
     show_menu(message)
 
@@ -378,39 +487,42 @@ def handle_buttons(message):
     # === Расписание ===
     if message.text == 'Расписание':
         try:
-            # Отправка локального изображения
-            ph = open('raspisanie_23.jpg','rb')
-            bot.send_photo(message.chat.id, ph, 'Расписание')
+            # Отправка локального изображения (после первой загрузки - по file_id)
+            file_cache.send_file(bot, 'photo', message.chat.id, 'raspisanie_23.jpg', caption='Расписание')
         except:
             pass
         
-        # Отправка изображения по URL
+        # Отправка изображения по URL (Telegram скачивает его только в первый раз)
         url = 'https://i.neredekal.com/i/neredekal/75/870x562/6475ad5e077183cdf10107f3'
-        bot.send_photo(message.chat.id, url, 'Наблюдаем за расписанием')
+        file_cache.send_file(bot, 'photo', message.chat.id, url, caption='Наблюдаем за расписанием')
     
     # === Домашнее задание ===
     elif message.text == 'ДЗ':
         try:
-            doc = open('Домашнее задание.pdf','rb')
-            bot.send_document(
+            file_cache.send_file(
+                bot, 'document',
                 message.chat.id, 
-                doc,
+                'Домашнее задание.pdf',
                 caption='ДЗ',
                 visible_file_name='Домашнее задание.pdf'  # Имя файла для пользователя
             )
         except:
             bot.reply_to(message, "Файл с ДЗ не найден")
     
+    # === Отмена генерации GigaChat (ответа или материалов темы) ===
+    elif message.text.lower() == 'отмена':
+        if llm_jobs.cancel(message.chat.id):
+            bot.send_message(message.chat.id, "Генерация отменена")
+            cleanup_session(message.chat.id)  # Сессия темы и кнопка "Меню"
+    
     # === Приветствие ===
     elif str(message.text).lower() == 'привет':
         bot.reply_to(message, "Привет!")  
     
     # === Фото ===
     elif message.text == 'Фото':
-        try:
-            ph = open('name_file.jpg','rb')
-            bot.send_photo(message.chat.id, ph, 'Ваше последнее фото')
-        except:
+        # Последнее фото именно этого пользователя (по file_id, без загрузки)
+        if not photo_store.send_latest(bot, message.chat.id, message.from_user.id, 'Ваше последнее фото'):
             bot.reply_to(message, "Фото отсутствует, отправьте новое.")
     
     # === Запрос к GigaChat ===
@@ -436,9 +548,8 @@ def handle_buttons(message):
     
     # === Обучение ===
     elif message.text == "Начать обучение":
-        user_data = load_user_data()
         user_id = str(message.from_user.id)
-        level = user_data[user_id]['level']
+        level = user_store.get_field(user_id, 'level')
         
         markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
         markup.add('Меню')
@@ -457,9 +568,8 @@ def handle_buttons(message):
     
     # === Тестирование ===
     elif message.text == 'Начать тестирование':
-        user_data = load_user_data()
         user_id = str(message.from_user.id)
-        level = user_data[user_id]['level']
+        level = user_store.get_field(user_id, 'level')
         
         markup = types.ReplyKeyboardMarkup()
         # Создание кнопок для доступных тестов
@@ -480,28 +590,72 @@ def handle_buttons(message):
     
     # === Админка: Показать пользователей ===
     elif message.text == 'Показать пользователей' and str(message.from_user.id) in admin_id:
-        user_data = load_user_data()
-        for user in user_data.keys():
-            bot.send_message(
-                message.from_user.id,
-                f'Пользователь ID {user}, данные {user_data[user]}'
-            )
-        bot.send_message(
-            message.from_user.id,
-            f'Всего пользователей - {len(user_data.keys())}'
-        )
+        # Все пользователи одним файлом вместо сообщения на каждого
+        bot.send_chat_action(message.chat.id, 'upload_document')
+        with outbox.bulk():
+            send_users_export(bot, message.chat.id, export_format)
+        # Постраничный список с кнопками листания
+        show_users_page(message.chat.id, 0)
     
     # === Админка: Сброс данных ===
     elif message.text == 'Удалить всех пользователей' and str(message.from_user.id) in admin_id:
-        if os.path.exists('user_data.pkl'):
-            os.remove('user_data.pkl')
+        if user_store.count_users():
+            user_store.clear()  # Очистка хранилища и пустой снимок
             bot.send_message(message.from_user.id, f'Файл удалён и создан пустым')
-            save_user_data({})  # Создание пустой БД
             Register_menu(message)
         else:
             bot.send_message(message.from_user.id, f'Файл отсутствует.')
     elif message.text == 'Изучить тему':
         start_learning_session(message)
+    
+    # === Админка: Состояние очередей ===
+    elif message.text == 'Состояние очередей' and str(message.from_user.id) in admin_id:
+        stats = outbox.stats()
+        bot.send_message(
+            message.from_user.id,
+            f"Исходящая очередь: {stats.get('queued', 0)} "
+            f"(ответы {stats.get('interactive', 0)}, рассылки {stats.get('bulk', 0)}), "
+            f"чатов {stats.get('chats', 0)}, в полёте {stats.get('in_flight', 0)}\n"
+            f"Отправлено {stats.get('sent', 0)}, повторов 429 {stats.get('retries', 0)}, "
+            f"ошибок {stats.get('failed', 0)}\n"
+            f"Очереди полос обработки: {bot.lane_depths()}"
+        )
+        cache = llm_cache.stats()
+        bot.send_message(
+            message.from_user.id,
+            f"Кэш ответов GigaChat: попаданий {cache['memory_hits']} (память) + "
+            f"{cache['disk_hits']} (диск), промахов {cache['misses']}, "
+            f"доля попаданий {cache['hit_rate']:.0%}\n"
+            f"В памяти {cache['memory_items']} ответов, на диске {cache['disk_bytes'] // 1024} КБ, "
+            f"вытеснено {cache['evictions']}"
+        )
+        jobs = llm_jobs.stats()
+        admission = llm_admission.stats()
+        bot.send_message(
+            message.from_user.id,
+            f"Генерации GigaChat: в очереди {jobs['queued']}, выполняется {jobs['running']}\n"
+            f"Готово {jobs['done']}, повторов {jobs['retries']}, по сроку {jobs['timeouts']}, "
+            f"ошибок {jobs['failed']}, отменено {jobs['cancelled']}\n"
+            f"Допуск: принято {admission['admitted']}, отказов по частоте {admission['rejected_rate']}, "
+            f"из-за незавершённых {admission['rejected_busy']}, из-за очереди {admission['rejected_queue']}"
+        )
+    
+    # === Прогресс по тестам «Изучить тему» ===
+    elif message.text == 'Мой прогресс':
+        stats = user_store.history_stats(message.from_user.id)
+        if not stats['attempts']:
+            bot.send_message(message.chat.id, 'Вы ещё не проходили тесты')
+        else:
+            text = (
+                f"📈 Пройдено тестов: {stats['attempts']}\n"
+                f"Средний результат: {stats['mean']:.1f}%\n"
+                f"Лучший результат: {stats['best']:.1f}%\n"
+                f"Последний результат: {stats['last']:.1f}%\n"
+                f"За 7 дней: {stats['week_attempts']} тестов"
+            )
+            if stats['week_attempts']:
+                text += f", в среднем {stats['week_mean']:.1f}%"
+            bot.send_message(message.chat.id, text)
     elif message.text == 'Сколько будет 2+2?':
         bot.send_message(
                 message.from_user.id,
@@ -515,55 +669,37 @@ def handle_buttons(message):
 # Обработчик получения фото
 @bot.message_handler(content_types=['photo'])
 def photoes(message):
-    # Получение file_id самого большого варианта фото
-    file_id = message.photo[-1].file_id
-    # Получение информации о файле
-    file_info = bot.get_file(file_id)
-    # Скачивание файла
-    download_file = bot.download_file(file_info.file_path)
-    # Сохранение файла
-    with open('name_file.jpg', 'wb') as new_f:
-        new_f.write(download_file)
+    # Самый большой вариант фото скачивается потоково в хранилище пользователя
+    try:
+        photo_store.save_photo(bot, message.from_user.id, message.photo[-1])
+    except ValueError as e:
+        bot.reply_to(message, f'Фото не сохранено: {e}')
+        return
     bot.reply_to(message, 'Фото сохранено')
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("learntest_"))
 def handle_learning_test_answer(call):
     """Обработка ответов на вопросы теста"""
-    chat_id = str(call.message.chat.id)
-    session = learning_sessions.get(chat_id)
-    if not session or session['stage'] != 'testing':
-        return
-    
-    # print(call.data)
-    _, q_idx, a_idx, c_idx = call.data.split('_')
-    # print(q_idx,a_idx, c_idx)
-    q_idx, a_idx, c_idx = map(int, (q_idx, a_idx, c_idx))
-    question = session['questions'][q_idx]
-    
-    # Формируем ответ
-    response_msg = (
-        f"{call.message.text}\n\n"
-        f" Ваш ответ: {a_idx+1}. {question['options'][a_idx]}\n"
-    )
-    
-    if a_idx+1 == c_idx:
-        session['correct_answers'] += 1
-        response_msg += " Верно!"
-    else:
-        response_msg += (
-            f" Неверно.\n"
-            f" Правильный ответ: {c_idx}. {question['options'][c_idx-1]}"
-        )
-    
-    # Редактируем сообщение
-    bot.edit_message_text(
-        chat_id=chat_id,
-        message_id=session['last_question_msg'],
-        text=response_msg
-    )
-    
-    # Следующий вопрос
-    send_question_gpt(chat_id, q_idx + 1)
+    handle_test_answer(call)
 
-# Запуск бота (бесконечный цикл опроса серверов Telegram)
-bot.polling() 
\ No newline at end of file
+# Запуск бота
+try:
+    if bot_mode == 'webhook':
+        # Telegram сам присылает обновления на встроенный HTTP-сервер
+        run_webhook(
+            bot, webhook_url,
+            listen=webhook_listen, port=webhook_port, path=webhook_path,
+            secret=webhook_secret, queue_size=webhook_queue_size,
+            ssl_cert=webhook_ssl_cert, ssl_key=webhook_ssl_key
+        )
+    else:
+        # Запасной вариант: бесконечный цикл опроса серверов Telegram
+        bot.remove_webhook()  # Пока webhook установлен, опрос не работает
+        bot.polling()
+finally:
+    # Последний снимок состояния перед остановкой
+    state_snapshot.close()
+    # Сжатие журнала (или закрытие SQLite) хранилища пользователей
+    user_store.close()
+    # Закрытие соединений с GigaChat
+    submit(close_gigachat()).result(timeout=5) 
\ No newline at end of file
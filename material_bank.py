@@ -0,0 +1,166 @@
+# Банк готовых материалов "Изучить тему"
+# Теория и вопросы по темам программы генерируются заранее, пакетом, в
+# нерабочее время (`python material_bank.py темы.txt`), проверяются и
+# хранятся по нормализованной теме. Бот отдаёт готовые материалы сразу,
+# а GigaChat вызывает только для новых тем - удачные новые материалы
+# тоже попадают в банк. Банк хранится в JSON и переживает перезапуск
+import argparse  # Аргументы командной строки
+import asyncio  # Пакетная генерация
+import copy  # Каждой сессии - своя копия материалов
+import json  # Формат файла банка
+import os  # Для работы с файловой системой
+import threading  # Банк используется из разных потоков
+import time  # Время добавления материалов
+
+BANK_FILE = 'material_bank.json'  # Файл банка {тема: {'topic', 'theory', 'questions', 'created'}}
+MIN_THEORY = 300  # Наименьшая длина теории, символов
+MIN_QUESTIONS = 3  # Наименьшее число вопросов
+
+_bundles = {}  # Материалы по нормализованной теме
+_lock = threading.Lock()  # Защищает _bundles и файл банка
+_loaded = False  # Загружен ли банк с диска
+
+
+def normalize(topic):
+    """Нормализация темы: регистр, пробелы, ё и знаки в конце не важны"""
+    return ' '.join(topic.split()).casefold().replace('ё', 'е').strip(' .!?…')
+
+
+def load(path=None):
+    """Загрузка банка с диска (path - другой файл банка)"""
+    global BANK_FILE, _bundles, _loaded
+    with _lock:
+        if path:
+            BANK_FILE = path
+        try:
+            with open(BANK_FILE, 'r', encoding='utf-8') as f:
+                _bundles = json.load(f)
+        except FileNotFoundError:
+            _bundles = {}
+        except ValueError as e:
+            print(f"Банк материалов {BANK_FILE} повреждён и будет создан заново: {e}")
+            _bundles = {}
+        _loaded = True
+
+
+def _save():
+    """Запись банка на диск (вызывается под _lock)"""
+    tmp = BANK_FILE + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(_bundles, f, ensure_ascii=False)
+    os.replace(tmp, BANK_FILE)
+
+
+def validate(theory, questions):
+    """Проверка материалов; возвращает описание ошибки или None"""
+    if len(theory.strip()) < MIN_THEORY:
+        return f'теория короче {MIN_THEORY} символов'
+    if len(questions) < MIN_QUESTIONS:
+        return f'вопросов меньше {MIN_QUESTIONS}'
+    for question in questions:
+        if not question['text'].strip():
+            return 'вопрос без текста'
+        if len(question['options']) != 4 or not all(option.strip() for option in question['options']):
+            return 'у вопроса не 4 варианта ответа'
+        if not 1 <= question['correct'] <= 4:
+            return 'номер правильного ответа не от 1 до 4'
+    return None
+
+
+def get(topic):
+    """Материалы по теме (теория, вопросы) или None"""
+    if not _loaded:
+        load()
+    with _lock:
+        bundle = _bundles.get(normalize(topic))
+        if bundle is None:
+            return None
+        return bundle['theory'], copy.deepcopy(bundle['questions'])
+
+
+def add(topic, theory, questions, replace=False):
+    """Добавление проверенных материалов; False, если они не прошли проверку
+    или тема уже есть (и replace не задан)"""
+    if validate(theory, questions):
+        return False
+    if not _loaded:
+        load()
+    key = normalize(topic)
+    with _lock:
+        if key in _bundles and not replace:
+            return False
+        _bundles[key] = {
+            'topic': topic.strip(),
+            'theory': theory,
+            'questions': [{k: v for k, v in q.items() if k != 'original_format'} for q in questions],
+            'created': time.time()
+        }
+        _save()
+    return True
+
+
+def topics():
+    """Темы банка (в исходном написании)"""
+    if not _loaded:
+        load()
+    with _lock:
+        return [bundle['topic'] for bundle in _bundles.values()]
+
+
+async def _generate(topic, force, attempts, slots):
+    """Генерация, разбор и проверка материалов одной темы"""
+    from learn import material_prompt, parse_materials  # Тот же запрос и разбор, что у бота
+    from request import gpt_request_async, forget_cached
+    if not force and get(topic) is not None:
+        return 'уже в банке'
+    prompt = material_prompt(topic)
+    problem = 'нет ответа'
+    async with slots:
+        for attempt in range(attempts):
+            try:
+                response = await gpt_request_async(prompt)
+                theory, questions = parse_materials(response)
+                problem = validate(theory, questions)
+            except Exception as e:
+                problem = str(e) or repr(e)
+            if problem is None:
+                add(topic, theory, questions, replace=True)
+                return 'добавлена'
+            await forget_cached(prompt)  # Следующая попытка - новая генерация
+    return f'не добавлена: {problem}'
+
+
+async def _generate_all(topics, force, attempts, concurrency):
+    """Пакетная генерация тем с ограничением одновременных запросов"""
+    from request import aclose
+    slots = asyncio.Semaphore(concurrency)
+    try:
+        results = await asyncio.gather(*[_generate(topic, force, attempts, slots) for topic in topics])
+    finally:
+        await aclose()
+    for topic, result in zip(topics, results):
+        print(f"{topic}: {result}")
+    added = sum(result == 'добавлена' for result in results)
+    print(f"Добавлено {added} из {len(topics)}, в банке {len(_bundles)} тем")
+
+
+if __name__ == '__main__':
+    # Пакетная генерация: python material_bank.py темы.txt [--force] [--concurrency 4]
+    import material_bank  # Тот же модуль, что видит learn (а не копия __main__)
+    parser = argparse.ArgumentParser(description='Пакетная генерация банка материалов')
+    parser.add_argument('topics', help='файл с темами, по одной в строке (# - комментарий)')
+    parser.add_argument('--bank', default=BANK_FILE, help='файл банка')
+    parser.add_argument('--force', action='store_true', help='сгенерировать заново темы, уже бывшие в банке')
+    parser.add_argument('--attempts', type=int, default=3, help='попыток на тему')
+    parser.add_argument('--concurrency', type=int, default=4, help='одновременных запросов')
+    args = parser.parse_args()
+    with open(args.topics, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    # Одна тема в разном написании генерируется один раз
+    topic_list, seen = [], set()
+    for line in lines:
+        if line and not line.startswith('#') and normalize(line) not in seen:
+            seen.add(normalize(line))
+            topic_list.append(line)
+    material_bank.load(args.bank)
+    asyncio.run(material_bank._generate_all(topic_list, args.force, args.attempts, args.concurrency))
@@ -0,0 +1,255 @@
+# Очередь исходящих вызовов Bot API с учётом ограничений Telegram
+# Все отправки бота (send*, edit*, copy*, forward*) проходят через
+# единый диспетчер: не больше ~30 сообщений в секунду всего и ~1 в
+# секунду в один чат, ответ 429 останавливает отправку на retry_after
+# (Telegram не сообщает, чат или весь бот превысил ограничение, поэтому
+# пауза общая) и повторяется, а интерактивные ответы обгоняют массовые
+# рассылки.
+# Подключается через telebot.apihelper.CUSTOM_REQUEST_SENDER, поэтому
+# обработчики вызывают bot.send_message как раньше и получают результат
+import heapq  # Очереди с приоритетом
+import itertools  # Порядковые номера заданий
+import threading  # Диспетчер и блокировки
+import time  # Монотонные часы
+from collections import deque  # Очередь заданий одного чата
+from concurrent.futures import Future, ThreadPoolExecutor  # Выполнение запросов
+from contextlib import contextmanager  # Контекст массовой отправки
+from telebot import apihelper  # Точка подключения и HTTP-сессия telebot
+from ratelimit import TokenBucket  # Ведро токенов
+
+INTERACTIVE = 0  # Ответ на действие пользователя
+BULK = 1  # Массовая отправка (материалы урока, выгрузки)
+
+# Методы, на которые распространяются ограничения частоты Telegram
+RATE_LIMITED = ('send', 'edit', 'copy', 'forward')
+# Исключения: "печатает..." не сообщение и не должно занимать токен чата
+NOT_LIMITED = ('sendChatAction',)
+MAX_RETRIES = 5  # Повторов после 429 для одного вызова
+MAX_BUCKETS = 10000  # Сколько вёдер чатов держать до чистки
+
+_local = threading.local()  # Приоритет текущего потока
+_outbox = None  # Установленный диспетчер
+
+
+@contextmanager
+def bulk():
+    """Вызовы Bot API внутри блока идут с низким приоритетом
+
+        with outbox.bulk():
+            for part in parts:
+                bot.send_message(chat_id, part)
+    """
+    previous = getattr(_local, 'priority', INTERACTIVE)
+    _local.priority = BULK
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def _request(method, url, kwargs):
+    """Выполнение HTTP-запроса сессией telebot"""
+    return apihelper._get_req_session().request(method, url, **kwargs)
+
+
+def _retry_after(response):
+    """Пауза из ответа 429, секунд"""
+    try:
+        return float(response.json().get('parameters', {}).get('retry_after', 1))
+    except ValueError:
+        return 1.0
+
+
+def _rewind(files):
+    """Перемотка файлов в начало перед повторной отправкой"""
+    for value in (files or {}).values():
+        file = value[1] if isinstance(value, tuple) else value
+        if hasattr(file, 'seek'):
+            file.seek(0)
+
+
+class _Job:
+    """Один вызов Bot API, ожидающий отправки"""
+    __slots__ = ('priority', 'seq', 'method', 'url', 'kwargs', 'future', 'attempts')
+
+    def __init__(self, priority, seq, method, url, kwargs):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.future = Future()
+        self.attempts = 0
+
+
+class Outbox:
+    """Диспетчер исходящих вызовов
+
+    У каждого чата своя очередь заданий и своё ведро токенов; в полёте
+    не больше одного задания чата, поэтому порядок сообщений в чате
+    сохраняется. Из чатов, у которых есть токен, первым выбирается
+    задание с меньшим (приоритет, номер).
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3, workers=8, max_retries=MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.metrics = {'sent': 0, 'retries': 0, 'failed': 0}
+        self._cond = threading.Condition()
+        self._chats = {}  # chat_id -> deque заданий
+        self._buckets = {}  # chat_id -> ведро токенов чата
+        self._busy = set()  # Чаты, чьё задание сейчас выполняется
+        self._ready = []  # Куча (приоритет, номер, chat_id) чатов, готовых к отправке
+        self._waiting = []  # Куча (время, приоритет, номер, chat_id) чатов без токена
+        self._seq = itertools.count()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='outbox')
+        threading.Thread(target=self._dispatch, name='outbox', daemon=True).start()
+
+    def send(self, method, url, **kwargs):
+        """Замена HTTP-запроса telebot (CUSTOM_REQUEST_SENDER)"""
+        api_method = url.rsplit('/', 1)[-1]
+        chat_id = (kwargs.get('params') or {}).get('chat_id')
+        if chat_id is None or not api_method.startswith(RATE_LIMITED) or api_method in NOT_LIMITED:
+            return self._send_direct(method, url, kwargs)
+        priority = getattr(_local, 'priority', INTERACTIVE)
+        return self.submit(str(chat_id), method, url, kwargs, priority).result()
+
+    def _send_direct(self, method, url, kwargs):
+        """Запрос без очереди (getUpdates, getFile и т.п.), с повтором 429"""
+        for _ in range(self.max_retries):
+            response = _request(method, url, kwargs)
+            if response.status_code != 429:
+                return response
+            with self._cond:
+                self.metrics['retries'] += 1
+            retry_after = _retry_after(response)
+            self.global_bucket.block(retry_after)
+            time.sleep(retry_after)
+            _rewind(kwargs.get('files'))
+        return _request(method, url, kwargs)
+
+    def submit(self, chat_id, method, url, kwargs, priority=INTERACTIVE):
+        """Постановка вызова в очередь чата, возвращает Future с ответом"""
+        job = _Job(priority, next(self._seq), method, url, kwargs)
+        with self._cond:
+            jobs = self._chats.setdefault(chat_id, deque())
+            jobs.append(job)
+            if len(jobs) == 1 and chat_id not in self._busy:
+                heapq.heappush(self._ready, (job.priority, job.seq, chat_id))
+            self._cond.notify()
+        return job.future
+
+    def _bucket(self, chat_id):
+        """Ведро токенов чата"""
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_chat(self):
+        """Выбор следующего чата для отправки (вызывается под self._cond)"""
+        while True:
+            now = time.monotonic()
+            # Чаты, дождавшиеся токена, возвращаются в кучу готовых
+            while self._waiting and self._waiting[0][0] <= now:
+                _, priority, seq, chat_id = heapq.heappop(self._waiting)
+                heapq.heappush(self._ready, (priority, seq, chat_id))
+            if self._ready:
+                global_wait = self.global_bucket.delay(now)
+                if global_wait > 0:
+                    self._cond.wait(global_wait)
+                    continue
+                priority, seq, chat_id = heapq.heappop(self._ready)
+                bucket = self._bucket(chat_id)
+                chat_wait = bucket.delay(now)
+                if chat_wait > 0:
+                    heapq.heappush(self._waiting, (now + chat_wait, priority, seq, chat_id))
+                    continue
+                bucket.take(now)
+                self.global_bucket.take(now)
+                return chat_id
+            self._cond.wait(self._waiting[0][0] - now if self._waiting else None)
+
+    def _dispatch(self):
+        """Поток диспетчера: выдача заданий пулу с соблюдением ограничений"""
+        while True:
+            with self._cond:
+                chat_id = self._next_chat()
+                job = self._chats[chat_id].popleft()
+                self._busy.add(chat_id)
+            self._executor.submit(self._execute, chat_id, job)
+
+    def _execute(self, chat_id, job):
+        """Выполнение задания в пуле; 429 возвращает задание в начало очереди чата"""
+        try:
+            response = _request(job.method, job.url, job.kwargs)
+        except BaseException as e:
+            self._finish(chat_id, failed=True)
+            job.future.set_exception(e)
+            return
+        if response.status_code == 429 and job.attempts < self.max_retries:
+            retry_after = _retry_after(response)
+            job.attempts += 1
+            _rewind(job.kwargs.get('files'))
+            with self._cond:
+                self.metrics['retries'] += 1
+                self._bucket(chat_id).block(retry_after)
+                # Ограничение могло быть общим - остальные чаты тоже ждут
+                self.global_bucket.block(retry_after)
+                self._chats[chat_id].appendleft(job)
+                self._busy.discard(chat_id)
+                heapq.heappush(self._waiting, (time.monotonic() + retry_after, job.priority, job.seq, chat_id))
+                self._cond.notify()
+            return
+        self._finish(chat_id, failed=response.status_code != 200)
+        job.future.set_result(response)
+
+    def _finish(self, chat_id, failed=False):
+        """Освобождение чата после выполнения задания"""
+        with self._cond:
+            self.metrics['failed' if failed else 'sent'] += 1
+            self._busy.discard(chat_id)
+            jobs = self._chats[chat_id]
+            if jobs:
+                head = jobs[0]
+                heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+            else:
+                del self._chats[chat_id]
+                if len(self._buckets) > MAX_BUCKETS:
+                    self._forget_idle_buckets()
+            self._cond.notify()
+
+    def _forget_idle_buckets(self):
+        """Удаление полных вёдер чатов без заданий (вызывается под self._cond)"""
+        for chat_id in [chat_id for chat_id, bucket in self._buckets.items()
+                        if chat_id not in self._chats and bucket.idle()]:
+            del self._buckets[chat_id]
+
+    def stats(self):
+        """Метрики очереди: глубина по приоритетам, чаты, счётчики"""
+        with self._cond:
+            priorities = [job.priority for jobs in self._chats.values() for job in jobs]
+            return {
+                'queued': len(priorities),
+                'interactive': priorities.count(INTERACTIVE),
+                'bulk': priorities.count(BULK),
+                'chats': sum(1 for jobs in self._chats.values() if jobs),
+                'in_flight': len(self._busy),
+                **self.metrics
+            }
+
+
+def install(global_rate=30, chat_rate=1, chat_burst=3, workers=8):
+    """Подключение диспетчера ко всем вызовам Bot API"""
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(global_rate, chat_rate, chat_burst, workers)
+        apihelper.CUSTOM_REQUEST_SENDER = _outbox.send
+    return _outbox
+
+
+def stats():
+    """Метрики установленного диспетчера (пустой словарь, если он не подключён)"""
+    return _outbox.stats() if _outbox else {}
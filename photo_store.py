@@ -0,0 +1,103 @@
+# Хранилище фотографий, присланных пользователями
+# Фото скачивается потоково, кусками, сразу в файл с подсчётом sha256;
+# файл сохраняется под именем хэша (photos/ab/abcdef....jpg), поэтому
+# одинаковые фото хранятся один раз, а одновременные загрузки разных
+# пользователей не мешают друг другу. Последнее фото каждого
+# пользователя (хэш и file_id Telegram) хранится в его данных (поле
+# photo) и переживает перезапуск, а кнопка "Фото" отправляет его по
+# file_id без загрузки
+import hashlib  # Хэш содержимого
+import os  # Для работы с файловой системой
+import tempfile  # Временный файл на время скачивания
+from telebot import apihelper  # HTTP-сессия и адрес файлов Bot API
+from telebot.apihelper import ApiTelegramException  # Ошибка Bot API (устаревший file_id)
+import user_store  # Последнее фото в данных пользователя
+
+STORE_DIR = 'photos'  # Каталог хранилища
+MAX_SIZE = 10 * 1024 * 1024  # Наибольший размер фото, байт
+CHUNK_SIZE = 64 * 1024  # Размер куска при скачивании
+DOWNLOAD_TIMEOUT = 30  # Таймаут скачивания, секунд
+
+
+def photo_path(digest):
+    """Путь к файлу фото по хэшу"""
+    return os.path.join(STORE_DIR, digest[:2], digest + '.jpg')
+
+
+def _file_url(token, file_path):
+    """Адрес скачивания файла (как в telebot: FILE_URL или api.telegram.org)"""
+    template = apihelper.FILE_URL or 'https://api.telegram.org/file/bot{0}/{1}'
+    return template.format(token, file_path)
+
+
+def _download(url):
+    """Потоковое скачивание в хранилище; возвращает sha256 содержимого"""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=STORE_DIR, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            with apihelper._get_req_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT,
+                                                   proxies=apihelper.proxy) as response:
+                if response.status_code != 200:
+                    raise apihelper.ApiHTTPException('Download file', response)
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_SIZE:
+                        raise ValueError(f'фото больше {MAX_SIZE // 1024} КБ')
+                    digest.update(chunk)
+                    f.write(chunk)
+        digest = digest.hexdigest()
+        path = photo_path(digest)
+        if os.path.exists(path):
+            os.remove(tmp)  # Такое фото уже есть
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        return digest
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def save_photo(bot, user_id, photo):
+    """Сохранение фото (PhotoSize) как последнего фото пользователя; возвращает хэш
+
+    ValueError - фото больше MAX_SIZE или пользователь не зарегистрирован
+    """
+    # Фото хранится в данных пользователя - без регистрации их нет
+    if not user_store.is_registered(user_id):
+        raise ValueError('сначала пройдите регистрацию (/register)')
+    if photo.file_size and photo.file_size > MAX_SIZE:
+        raise ValueError(f'фото больше {MAX_SIZE // 1024} КБ')
+    file_info = bot.get_file(photo.file_id)
+    digest = _download(_file_url(bot.token, file_info.file_path))
+    with user_store.transaction(user_id) as user:
+        user['photo'] = {'sha256': digest, 'file_id': photo.file_id}
+    return digest
+
+
+def send_latest(bot, chat_id, user_id, caption=None):
+    """Отправка последнего фото пользователя; False, если фото нет"""
+    entry = user_store.get_field(user_id, 'photo')
+    if not entry:
+        return False
+    try:
+        bot.send_photo(chat_id, entry['file_id'], caption=caption)
+        return True
+    except ApiTelegramException as e:
+        if e.error_code != 400:
+            raise
+    # file_id не принят (например, сменился токен бота) - загружаем файл из хранилища
+    path = photo_path(entry['sha256'])
+    if not os.path.exists(path):
+        return False
+    with open(path, 'rb') as f:
+        message = bot.send_photo(chat_id, f, caption=caption)
+    with user_store.transaction(user_id) as user:
+        # Пока фото отправлялось, пользователь мог прислать новое
+        if (user.get('photo') or {}).get('sha256') == entry['sha256']:
+            user['photo'] = {'sha256': entry['sha256'], 'file_id': message.photo[-1].file_id}
+    return True
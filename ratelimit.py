@@ -0,0 +1,54 @@
+# Ведро токенов для ограничения частоты
+import threading  # Ведро может использоваться из разных потоков
+import time  # Монотонные часы
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity сразу"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)  # Новое ведро полное
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # Принудительная пауза (например, retry_after)
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """Пополнение ведра за прошедшее время"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now=None):
+        """Сколько секунд ждать до появления токена (0 - можно сейчас)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refill(now)
+            wait = max(0.0, self.blocked_until - now)
+            if self.tokens < 1:
+                wait = max(wait, (1 - self.tokens) / self.rate)
+            return wait
+
+    def take(self, now=None):
+        """Взять токен, если он есть; True при успехе"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refill(now)
+            if now < self.blocked_until or self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def block(self, seconds, now=None):
+        """Запрет выдачи токенов на seconds секунд"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0.0
+
+    def idle(self, now=None):
+        """Ведро полное и не заблокировано (его можно забыть)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._refill(now)
+            return self.tokens >= self.capacity and now >= self.blocked_until
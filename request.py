@@ -1,19 +1,149 @@
 from gigachat import GigaChat
-import ssl
+import asyncio
+import threading
+import config
+import llm_cache
+from async_runtime import get_loop
 
+# Один долгоживущий клиент GigaChat на весь процесс: соединения (TLS)
+# переиспользуются пулом httpx, а токен OAuth запрашивается заново
+# только когда истекает срок действия текущего. Все запросы идут через
+# цикл async_runtime, их число ограничено gigachat_max_concurrency,
+# лишние ждут свободного места
+_giga = None
+_giga_lock = threading.Lock()
+_max_concurrency = getattr(config, 'gigachat_max_concurrency', 8)
+_slots = asyncio.Semaphore(_max_concurrency)  # Свободные места для запросов
+
+MODEL = 'Gigachat'
+# Настройки генерации, от которых зависит ответ (входят в ключ кэша ответов);
+# при передаче модели температуры и т.п. их нужно добавить сюда
+GENERATION = {}
+
+def _client():
+    global _giga
+    if _giga is None:
+        with _giga_lock:
+            if _giga is None:
+                # Адреса API и авторизации можно заменить (например, на
+                # локальную заглушку fake_gigachat.py для нагрузочных проверок)
+                urls = {}
+                if getattr(config, 'gigachat_base_url', None):
+                    urls['base_url'] = config.gigachat_base_url
+                if getattr(config, 'gigachat_auth_url', None):
+                    urls['auth_url'] = config.gigachat_auth_url
+                _giga = GigaChat(
+                    credentials = open('gpt_api.txt').read(),
+                    scope = 'GIGACHAT_API_PERS',
+                    model = MODEL,
+                    verify_ssl_certs = False,
+                    timeout = getattr(config, 'gigachat_timeout', 60),
+                    max_connections = _max_concurrency,
+                    **urls
+                )
+    return _giga
+
+# Синхронный вариант: тот же клиент и те же ограничения, поток ждёт ответа
 def gpt_request(text):
-    ssl_c = ssl.create_default_context()
-    ssl_c.check_hostname = False
-    ssl_c.verify_mode = ssl.CERT_NONE
-
-    giga = GigaChat(
-        credentials = open('gpt_api.txt').read(),
-        scope = 'GIGACHAT_API_PERS',
-        model = 'Gigachat',
-        verify_ssl_certs = False
-    )
-
-    answer = giga.chat(text)
-    return (answer.choices[0].message.content)
+    return asyncio.run_coroutine_threadsafe(gpt_request_async(text), get_loop()).result()
+
+# Асинхронный вариант для цикла async_runtime: пока ждём ответ,
+# поток не занят и другие чаты обслуживаются
+async def gpt_request_async(text, cache=True):
+    return ''.join([piece async for piece in gpt_stream_async(text, cache)])
+
+# Идущие генерации: {ключ кэша: _Flight}. Одинаковые запросы, пришедшие
+# одновременно (весь класс вводит одну тему), не генерируются заново, а
+# получают куски ответа от уже идущей генерации
+_flights = {}
+
+class _Flight:
+    """Идущая генерация: полученные куски ответа и ожидающие их читатели"""
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Condition()
+        self.task = None
+        self.readers = 0  # Сколько читателей ждут ответ; без читателей генерация отменяется
+
+async def _generate(key, text, flight, cache):
+    """Генерация ответа для всех читателей (отдельной задачей: отмена
+    одного читателя не прерывает ответ остальным, уход последнего -
+    отменяет генерацию)"""
+    try:
+        giga = _client()
+        async with _slots:
+            async for chunk in giga.astream(text):
+                piece = chunk.choices[0].delta.content if chunk.choices else None
+                if piece:
+                    flight.parts.append(piece)
+                    async with flight.changed:
+                        flight.changed.notify_all()
+        content = ''.join(flight.parts)
+        if cache and content:
+            await llm_cache.put(key, content)
+    except Exception as e:
+        flight.error = e
+    finally:
+        if _flights.get(key) is flight:
+            del _flights[key]
+        flight.done = True
+        async with flight.changed:
+            flight.changed.notify_all()
+
+# Потоковый вариант: куски ответа отдаются по мере генерации, чтобы
+# пользователь видел текст сразу. Повторный запрос с тем же текстом (без
+# учёта регистра и пробелов) берётся из кэша ответов одним куском или
+# присоединяется к такой же идущей генерации. Читатель, прекративший
+# чтение, закрывает генератор (contextlib.aclosing), чтобы генерация без
+# читателей сразу освобождала место в _slots
+async def gpt_stream_async(text, cache=True):
+    key = llm_cache.make_key(text, MODEL, GENERATION)
+    if cache:
+        cached = await llm_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    flight = _flights.get(key) if cache else None
+    if flight is None:
+        flight = _Flight()
+        if cache:
+            _flights[key] = flight
+        flight.task = asyncio.create_task(_generate(key, text, flight, cache))
+    flight.readers += 1
+    try:
+        seen = 0
+        while True:
+            async with flight.changed:
+                await flight.changed.wait_for(lambda: len(flight.parts) > seen or flight.done)
+            # Куски отдаются вне блокировки - читатель может долго их показывать
+            while seen < len(flight.parts):
+                seen += 1
+                yield flight.parts[seen - 1]
+            if flight.done and seen == len(flight.parts):
+                break
+    finally:
+        flight.readers -= 1
+        if not flight.readers and not flight.done:
+            # Ответ больше никому не нужен (срок задания, отмена): новые
+            # читатели начнут свою генерацию, а эта прерывается
+            if _flights.get(key) is flight:
+                del _flights[key]
+            flight.task.cancel()
+    if flight.error is not None:
+        raise flight.error
+
+async def forget_cached(text):
+    """Удаление ответа на запрос из кэша (например, его не удалось разобрать)"""
+    await llm_cache.forget(llm_cache.make_key(text, MODEL, GENERATION))
+
+async def aclose():
+    """Закрытие соединений клиента (при остановке бота)"""
+    global _giga
+    if _giga is not None:
+        giga, _giga = _giga, None
+        await giga.aclose()
+
 if __name__ == "__main__":
-    print(gpt_request("Придумай стих про поросят"))
\ No newline at end of file
+    print(gpt_request("Придумай стих про поросят"))
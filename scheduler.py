@@ -0,0 +1,77 @@
+# Планировщик обновлений: порядок внутри чата, параллельность между чатами
+# Каждое обновление по chat_id попадает на одну и ту же полосу (поток
+# с очередью), поэтому обновления одного чата обрабатываются строго
+# по очереди, а разные чаты - параллельно на разных полосах.
+# Очереди полос ограничены: когда полоса переполнена, получение новых
+# обновлений (polling или очередь webhook) ждёт её освобождения
+import queue  # Ограниченные очереди полос
+import threading  # Потоки полос
+import zlib  # Стабильный хэш chat_id
+import telebot  # Базовый класс бота
+
+
+def update_chat_id(update):
+    """chat_id обновления (или id пользователя), None если определить нельзя"""
+    for name in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+        message = getattr(update, name, None)
+        if message is not None:
+            return message.chat.id
+    call = getattr(update, 'callback_query', None)
+    if call is not None:
+        return call.message.chat.id if call.message else call.from_user.id
+    for name in ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+                 'poll_answer', 'my_chat_member', 'chat_member', 'chat_join_request'):
+        event = getattr(update, name, None)
+        if event is not None:
+            chat = getattr(event, 'chat', None)
+            if chat is not None:
+                return chat.id
+            user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+            if user is not None:
+                return user.id
+    return None
+
+
+class ChatOrderedTeleBot(telebot.TeleBot):
+    """TeleBot, раскладывающий обновления по полосам chat_id"""
+
+    def __init__(self, token, lanes=8, lane_queue_size=100, **kwargs):
+        # Обработчики выполняются прямо в потоке полосы
+        kwargs['threaded'] = False
+        super().__init__(token, **kwargs)
+        self.lane_queues = [queue.Queue(maxsize=lane_queue_size) for _ in range(lanes)]
+        for index, lane in enumerate(self.lane_queues):
+            threading.Thread(target=self._run_lane, args=(lane,), name=f'lane-{index}', daemon=True).start()
+
+    def lane_of(self, chat_id):
+        """Номер полосы чата"""
+        return zlib.crc32(str(chat_id).encode()) % len(self.lane_queues)
+
+    def process_new_updates(self, updates):
+        """Раскладка обновлений по полосам (блокируется, если полоса полна)"""
+        for update in updates:
+            # Смещение polling двигается здесь, в потоке получения, до постановки
+            # на полосу: иначе следующий get_updates снова получит ещё не
+            # обработанные обновления. В полосах TeleBot сравнивает update_id с
+            # уже сдвинутым last_update_id и больше его не меняет
+            if update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+            chat_id = update_chat_id(update)
+            # Обновления без чата порядок не требуют - распределяем по update_id
+            key = chat_id if chat_id is not None else update.update_id
+            self.lane_queues[self.lane_of(key)].put(update)
+
+    def lane_depths(self):
+        """Длины очередей полос (для метрик)"""
+        return [lane.qsize() for lane in self.lane_queues]
+
+    def _run_lane(self, lane):
+        """Последовательная обработка обновлений одной полосы"""
+        while True:
+            update = lane.get()
+            try:
+                super().process_new_updates([update])
+            except Exception as e:
+                print(f"Ошибка обработки обновления {update.update_id}: {e}")
+            finally:
+                lane.task_done()
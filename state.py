@@ -0,0 +1,253 @@
+# Общее состояние диалогов: прогресс тестов, сессии обучения и
+# обработчики следующего шага
+# Состояние хранится за интерфейсом хранилища: MemoryState - словари
+# внутри процесса, RedisState - сервер Redis (или совместимый, например
+# fake_redis.py), общий для нескольких процессов бота за одним webhook.
+# Значения хранятся как JSON, поэтому изменения вложенных списков и
+# словарей нужно записывать обратно присваиванием
+import importlib  # Поиск функций-обработчиков по имени
+import json  # Формат значений
+import socket  # Соединение с Redis
+import threading  # Соединение с Redis своё у каждого потока
+from collections.abc import MutableMapping  # Интерфейс словаря
+from urllib.parse import urlparse  # Разбор адреса Redis
+from telebot.handler_backends import HandlerBackend  # Интерфейс хранилища обработчиков telebot
+
+KEY_PREFIX = 'aispec:'  # Префикс ключей в Redis
+
+
+class MemoryState:
+    """Хранилище состояния в памяти процесса"""
+
+    def __init__(self):
+        self._data = {}  # {пространство: {ключ: JSON}}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        with self._lock:
+            return self._data.get(namespace, {}).get(key)
+
+    def set(self, namespace, key, value):
+        with self._lock:
+            self._data.setdefault(namespace, {})[key] = value
+
+    def delete(self, namespace, key):
+        with self._lock:
+            return self._data.get(namespace, {}).pop(key, None) is not None
+
+    def pop(self, namespace, key):
+        with self._lock:
+            return self._data.get(namespace, {}).pop(key, None)
+
+    def keys(self, namespace):
+        with self._lock:
+            return list(self._data.get(namespace, {}))
+
+    def items(self, namespace):
+        with self._lock:
+            return dict(self._data.get(namespace, {}))
+
+
+class RedisError(Exception):
+    """Ошибка, которую вернул сервер Redis"""
+
+
+class RedisState:
+    """Хранилище состояния в Redis: пространство имён - хэш, ключ - поле хэша"""
+
+    def __init__(self, url='redis://127.0.0.1:6379/0', timeout=5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.password = parsed.password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    # --- протокол RESP ---
+
+    def _connect(self):
+        """Соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+            conn = self._local.conn = (sock, sock.makefile('rb'))
+            if self.password:
+                self._call('AUTH', self.password)
+            if self.db:
+                self._call('SELECT', self.db)
+        return conn
+
+    def _call(self, *args):
+        """Выполнение команды Redis, возвращает разобранный ответ"""
+        sock, reader = self._connect()
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        try:
+            sock.sendall(b''.join(parts))
+            return self._read(reader)
+        except (OSError, EOFError):
+            self._local.conn = None  # Следующий вызов переподключится
+            sock.close()
+            raise
+
+    def _read(self, reader):
+        """Чтение одного ответа RESP"""
+        line = reader.readline()
+        if not line:
+            raise EOFError('Redis закрыл соединение')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode('utf-8')
+        if kind == b'-':
+            raise RedisError(body.decode('utf-8'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)[:-2]
+            return data.decode('utf-8')
+        if kind == b'*':
+            length = int(body)
+            return None if length < 0 else [self._read(reader) for _ in range(length)]
+        raise RedisError(f'Неизвестный ответ Redis: {line!r}')
+
+    # --- интерфейс хранилища ---
+
+    def get(self, namespace, key):
+        return self._call('HGET', KEY_PREFIX + namespace, key)
+
+    def set(self, namespace, key, value):
+        self._call('HSET', KEY_PREFIX + namespace, key, value)
+
+    def delete(self, namespace, key):
+        return self._call('HDEL', KEY_PREFIX + namespace, key) > 0
+
+    def pop(self, namespace, key):
+        # HGET + HDEL в транзакции MULTI/EXEC, чтобы значение забрал один процесс
+        self._call('MULTI')
+        self._call('HGET', KEY_PREFIX + namespace, key)
+        self._call('HDEL', KEY_PREFIX + namespace, key)
+        value, deleted = self._call('EXEC')
+        return value if deleted else None
+
+    def keys(self, namespace):
+        return self._call('HKEYS', KEY_PREFIX + namespace)
+
+    def items(self, namespace):
+        flat = self._call('HGETALL', KEY_PREFIX + namespace)
+        return dict(zip(flat[::2], flat[1::2]))
+
+
+_backend = MemoryState()  # Текущее хранилище
+namespaces = set()  # Пространства имён, созданные StateDict и StateHandlerBackend
+
+
+def init(kind='memory', url=None):
+    """Выбор хранилища: 'memory' или 'redis'"""
+    global _backend
+    _backend = RedisState(url) if kind == 'redis' else MemoryState()
+    return _backend
+
+
+def backend():
+    """Текущее хранилище"""
+    return _backend
+
+
+class StateDict(MutableMapping):
+    """Словарь поверх хранилища состояния
+
+    Каждое чтение возвращает новую копию значения, поэтому после
+    изменения значение нужно присвоить обратно:
+
+        progress = user_progres[user_id]
+        progress[0] += 1
+        user_progres[user_id] = progress
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        namespaces.add(namespace)
+
+    def __getitem__(self, key):
+        value = _backend.get(self.namespace, str(key))
+        if value is None:
+            raise KeyError(key)
+        return json.loads(value)
+
+    def __setitem__(self, key, value):
+        _backend.set(self.namespace, str(key), json.dumps(value, ensure_ascii=False))
+
+    def __delitem__(self, key):
+        if not _backend.delete(self.namespace, str(key)):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return _backend.get(self.namespace, str(key)) is not None
+
+    def __iter__(self):
+        return iter(_backend.keys(self.namespace))
+
+    def __len__(self):
+        return len(_backend.keys(self.namespace))
+
+
+def _callback_name(callback):
+    """Имя функции-обработчика для хранения: 'модуль:имя'"""
+    return f'{callback.__module__}:{callback.__qualname__}'
+
+
+def _resolve_callback(name):
+    """Функция-обработчик по сохранённому имени"""
+    module_name, _, qualname = name.partition(':')
+    target = importlib.import_module(module_name)
+    for part in qualname.split('.'):
+        target = getattr(target, part)
+    return target
+
+
+class StateHandlerBackend(HandlerBackend):
+    """Хранилище обработчиков следующего шага telebot в хранилище состояния
+
+    Обработчик сохраняется по имени функции, поэтому его может вызвать
+    любой процесс бота с тем же кодом
+    """
+
+    def __init__(self, namespace='next_step_handlers'):
+        super().__init__()
+        self.namespace = namespace
+        namespaces.add(namespace)
+
+    def register_handler(self, handler_group_id, handler):
+        key = str(handler_group_id)
+        saved = json.loads(_backend.get(self.namespace, key) or '[]')
+        saved.append({
+            'callback': _callback_name(handler.callback),
+            'args': list(handler.args),
+            'kwargs': handler.kwargs
+        })
+        _backend.set(self.namespace, key, json.dumps(saved, ensure_ascii=False))
+
+    def clear_handlers(self, handler_group_id):
+        _backend.delete(self.namespace, str(handler_group_id))
+
+    def get_handlers(self, handler_group_id):
+        # Обработчик следующего шага срабатывает один раз - забираем и удаляем
+        saved = _backend.pop(self.namespace, str(handler_group_id))
+        if not saved:
+            return None
+        handlers = []
+        for item in json.loads(saved):
+            try:
+                callback = _resolve_callback(item['callback'])
+            except (ImportError, AttributeError):
+                # Обработчик из старой версии кода (например, из восстановленного снимка)
+                print(f"Обработчик {item['callback']} не найден, пропущен")
+                continue
+            handlers.append({'callback': callback, 'args': item['args'], 'kwargs': item['kwargs']})
+        return handlers or None
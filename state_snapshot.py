@@ -0,0 +1,125 @@
+# Снимок состояния диалогов для тёплого перезапуска
+# Периодически сохраняет все пространства имён state (прогресс тестов,
+# сессии обучения с уже сгенерированными материалами, обработчики
+# следующего шага) в сжатый файл и восстанавливает их при старте, так
+# что перезапуск бота не обрывает тесты и не требует новой генерации.
+# Формат снимка версионный: при изменении структуры состояния
+# VERSION увеличивается, а в UPGRADES добавляется функция перевода
+# снимка предыдущей версии, поэтому новый код читает старые снимки
+import gzip  # Сжатие снимка
+import json  # Формат снимка
+import os  # Атомарная замена файла
+import threading  # Фоновый поток сохранения
+import time  # Время снимка
+import state  # Хранилище состояния
+
+VERSION = 1  # Версия формата снимка
+
+# Переводы снимка между версиями: {версия: функция(data) -> data следующей версии}
+# Например, если в версии 2 переименуется поле сессии обучения, то UPGRADES[1]
+# переименует его во всех data['learning_sessions'] снимка версии 1
+UPGRADES = {}
+
+_saver = None  # Фоновый поток сохранения
+_stop = threading.Event()  # Сигнал остановки фонового потока
+_save_lock = threading.Lock()  # Не даёт двум сохранениям идти одновременно
+_last_state = None  # Последнее сохранённое состояние (чтобы не писать без изменений)
+_path = None  # Файл снимка
+
+
+def collect():
+    """Текущее состояние всех пространств имён: {пространство: {ключ: значение}}"""
+    backend = state.backend()
+    data = {}
+    for namespace in sorted(state.namespaces):
+        items = backend.items(namespace)
+        if items:
+            data[namespace] = {key: json.loads(value) for key, value in items.items()}
+    return data
+
+
+def save(path):
+    """Запись снимка (tmp + fsync + replace); False, если состояние не менялось"""
+    global _last_state
+    with _save_lock:
+        data = collect()
+        encoded = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        if encoded == _last_state:
+            return False
+        payload = '{"version":%d,"saved_at":%d,"state":%s}' % (VERSION, time.time(), encoded)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(gzip.compress(payload.encode('utf-8')))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        _last_state = encoded
+        return True
+
+
+def upgrade(snapshot):
+    """Перевод снимка к текущей версии формата"""
+    version = snapshot.get('version', 0)
+    if version > VERSION:
+        raise ValueError(f'снимок версии {version} новее кода (версия {VERSION})')
+    data = snapshot['state']
+    while version < VERSION:
+        if version not in UPGRADES:
+            raise ValueError(f'нет перевода снимка из версии {version}')
+        data = UPGRADES[version](data)
+        version += 1
+    return data
+
+
+def restore(path):
+    """Восстановление состояния из снимка; возвращает число восстановленных ключей
+
+    Ключи, которые уже есть в хранилище (например, в общем Redis от других
+    процессов), не перезаписываются - живое состояние важнее снимка
+    """
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'rb') as f:
+            snapshot = json.loads(gzip.decompress(f.read()).decode('utf-8'))
+        data = upgrade(snapshot)
+    except (OSError, EOFError, ValueError) as e:
+        print(f"Снимок состояния {path} не загружен: {e}")
+        return 0
+    backend = state.backend()
+    restored = 0
+    for namespace, items in data.items():
+        present = set(backend.keys(namespace))
+        for key, value in items.items():
+            if key not in present:
+                backend.set(namespace, key, json.dumps(value, ensure_ascii=False))
+                restored += 1
+    return restored
+
+
+def _save_loop(interval):
+    """Фоновое сохранение снимка"""
+    while not _stop.wait(interval):
+        try:
+            save(_path)
+        except Exception as e:
+            print(f"Ошибка сохранения снимка состояния: {e}")
+
+
+def start(path, interval=30):
+    """Восстановление состояния из снимка и запуск периодического сохранения"""
+    global _saver, _path
+    _path = path
+    restored = restore(path)
+    if restored:
+        print(f"Восстановлено из снимка состояния: {restored} записей")
+    if _saver is None:
+        _saver = threading.Thread(target=_save_loop, args=(interval,), name='state-snapshot', daemon=True)
+        _saver.start()
+
+
+def close():
+    """Остановка фонового потока и финальный снимок"""
+    _stop.set()
+    if _path:
+        save(_path)
@@ -0,0 +1,57 @@
+# Проверка ChatOrderedTeleBot: polling не получает повторно обновления,
+# которые ещё ждут или обрабатываются на полосах
+#
+#     python -m unittest test_scheduler
+import threading  # Ожидание обработки
+import time  # Медленный обработчик
+import unittest  # Проверки
+from telebot import types  # Обновления
+from scheduler import ChatOrderedTeleBot  # Проверяемый бот
+
+
+def message_update(update_id, chat_id=1):
+    """Обновление с текстовым сообщением"""
+    return types.Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Тест'},
+            'chat': {'id': chat_id, 'type': 'private'},
+            'date': int(time.time()),
+            'text': f'сообщение {update_id}'
+        }
+    })
+
+
+class PollingOffsetTest(unittest.TestCase):
+
+    def test_updates_are_not_fetched_twice(self):
+        bot = ChatOrderedTeleBot('0:test', lanes=2)
+        server = [message_update(update_id) for update_id in (1, 2, 3)]
+        offsets, handled = [], []
+        finished = threading.Event()
+
+        def get_updates(offset=None, **kwargs):
+            # Заглушка Bot API: отдаёт обновления не раньше offset
+            offsets.append(offset)
+            return [update for update in server if update.update_id >= offset]
+
+        @bot.message_handler(func=lambda message: True)
+        def slow_handler(message):
+            time.sleep(0.1)
+            handled.append(message.message_id)
+            if len(handled) >= 3:
+                finished.set()
+
+        bot.get_updates = get_updates
+        for _ in range(3):
+            bot._TeleBot__retrieve_updates(timeout=0, long_polling_timeout=0)
+        self.assertTrue(finished.wait(5))
+        time.sleep(0.3)  # Повторы, если бы они были, успели бы обработаться
+        self.assertEqual(offsets, [1, 4, 4])
+        self.assertEqual(handled, [1, 2, 3])
+        self.assertEqual(bot.last_update_id, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
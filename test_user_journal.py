@@ -0,0 +1,54 @@
+# Проверка user_journal: перевод старой истории и проигрывание журнала
+# после сбоя
+#
+#     python -m unittest test_user_journal
+import os  # Рабочий каталог
+import pickle  # Старый снимок
+import shutil  # Удаление временного каталога
+import tempfile  # Временный каталог
+import unittest  # Проверки
+import user_journal  # Проверяемое хранилище
+
+
+def reload():
+    """Загрузка с диска, как после падения бота (без сжатия при остановке)"""
+    if user_journal._journal is not None:
+        user_journal._journal.close()
+    user_journal._users.clear()
+    user_journal._journal = None
+    user_journal._loaded = False
+    with user_journal._lock:
+        user_journal._load()
+
+
+class LegacyHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)
+
+    def tearDown(self):
+        if user_journal._journal is not None:
+            user_journal._journal.close()
+        user_journal._users.clear()
+        user_journal._journal = None
+        user_journal._loaded = False
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir)
+
+    def test_result_after_conversion_survives_crash(self):
+        legacy = {'1': {'phone': 'x', 'learning_history': [{'score': 50, 'date': '2024-01-01 10:00'}]}}
+        with open(user_journal.SNAPSHOT_FILE, 'wb') as f:
+            pickle.dump(legacy, f)
+        reload()
+        self.assertTrue(user_journal.add_result(1, 90))
+        reload()  # Падение до очередного сжатия
+        stats = user_journal.history_stats(1)
+        self.assertEqual(stats['attempts'], 2)
+        self.assertEqual(stats['last'], 90.0)
+        self.assertNotIn('learning_history', user_journal.get_user(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,326 @@
+# Хранилище пользователей в базе SQLite
+# Строки пользователей ключуются по user_id, история обучения лежит
+# в отдельной таблице (время эпохи + результат), а агрегаты истории -
+# в колонках пользователя, поэтому поиск одного пользователя и его
+# сводка не зависят ни от числа пользователей, ни от длины истории
+import sqlite3  # Встроенная база данных
+import pickle  # Для полей без отдельной колонки
+import threading  # Соединение SQLite своё у каждого потока
+import time  # Текущее время для истории
+from contextlib import contextmanager  # Для транзакций
+from datetime import datetime  # Для перевода старых дат истории
+import history  # Компактная история результатов
+
+DB_FILE = 'user_data.db'  # Файл базы
+
+# Поля, под которые заведены отдельные колонки
+COLUMNS = ('phone', 'level', 'level_math', 'score_math')
+# Колонки агрегатов истории: колонка -> ключ в словаре history
+AGGREGATES = {'attempts': 'attempts', 'score_sum': 'sum', 'best_score': 'best',
+              'last_score': 'last', 'last_ts': 'last_ts'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    phone TEXT,
+    level INTEGER,
+    level_math INTEGER,
+    score_math INTEGER,
+    extra BLOB,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    best_score REAL,
+    last_score REAL,
+    last_ts INTEGER
+);
+CREATE TABLE IF NOT EXISTS learning_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    score REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Запросы горячего пути. Тексты запросов неизменны, поэтому sqlite3
+# компилирует их один раз и берёт из кэша подготовленных выражений
+SQL_EXISTS = 'SELECT 1 FROM users WHERE user_id = ?'
+SQL_USER_COLUMNS = 'phone, level, level_math, score_math, extra, attempts, score_sum, best_score, last_score, last_ts'
+SQL_GET = f'SELECT {SQL_USER_COLUMNS} FROM users WHERE user_id = ?'
+SQL_GET_FIELD = {name: f'SELECT {name} FROM users WHERE user_id = ?' for name in COLUMNS}
+SQL_INSERT = 'INSERT OR IGNORE INTO users (user_id) VALUES (?)'
+SQL_SET_FIELD = {name: f'UPDATE users SET {name} = ? WHERE user_id = ?' for name in COLUMNS}
+SQL_GET_EXTRA = 'SELECT extra FROM users WHERE user_id = ?'
+SQL_SET_EXTRA = 'UPDATE users SET extra = ? WHERE user_id = ?'
+SQL_RESULT_APPEND = 'INSERT INTO learning_history (user_id, ts, score) VALUES (?, ?, ?)'
+SQL_RESULT_AGGREGATE = (
+    'UPDATE users SET attempts = attempts + 1, score_sum = score_sum + :score, '
+    'best_score = MAX(COALESCE(best_score, :score), :score), '
+    'last_score = :score, last_ts = :ts WHERE user_id = :user_id'
+)
+SQL_SET_AGGREGATES = (
+    'UPDATE users SET attempts = ?, score_sum = ?, best_score = ?, last_score = ?, last_ts = ? '
+    'WHERE user_id = ?'
+)
+SQL_AGGREGATES = 'SELECT attempts, score_sum, best_score, last_score, last_ts FROM users WHERE user_id = ?'
+SQL_WEEK = 'SELECT COUNT(*), AVG(score) FROM learning_history WHERE user_id = ? AND ts >= ?'
+SQL_ALL = f'SELECT user_id, {SQL_USER_COLUMNS} FROM users ORDER BY user_id'
+SQL_PAGE = SQL_ALL + ' LIMIT ? OFFSET ?'
+SQL_COUNT = 'SELECT COUNT(*) FROM users'
+
+_local = threading.local()  # Соединения по потокам
+
+
+def _conn():
+    """Соединение с базой для текущего потока"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=30, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')  # Читатели не ждут писателя
+        conn.execute('PRAGMA synchronous=NORMAL')  # В режиме WAL этого достаточно
+        _local.conn = conn
+    return conn
+
+
+def _migrate(conn):
+    """Перевод базы старого формата (история с датой-строкой) на новый"""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+    for name, decl in (('attempts', 'INTEGER NOT NULL DEFAULT 0'), ('score_sum', 'REAL NOT NULL DEFAULT 0'),
+                       ('best_score', 'REAL'), ('last_score', 'REAL'), ('last_ts', 'INTEGER')):
+        if name not in columns:
+            conn.execute(f'ALTER TABLE users ADD COLUMN {name} {decl}')
+    history_columns = {row[1] for row in conn.execute('PRAGMA table_info(learning_history)')}
+    if 'ts' not in history_columns:
+        conn.execute('ALTER TABLE learning_history ADD COLUMN ts INTEGER')
+        for row_id, date in conn.execute('SELECT id, date FROM learning_history').fetchall():
+            try:
+                ts = int(datetime.strptime(date, "%Y-%m-%d %H:%M").timestamp())
+            except (TypeError, ValueError):
+                ts = 0
+            conn.execute('UPDATE learning_history SET ts = ? WHERE id = ?', (ts, row_id))
+        # Пересчёт агрегатов по перенесённой истории
+        conn.execute("""
+            UPDATE users SET
+                attempts = (SELECT COUNT(*) FROM learning_history h WHERE h.user_id = users.user_id),
+                score_sum = (SELECT COALESCE(SUM(score), 0) FROM learning_history h WHERE h.user_id = users.user_id),
+                best_score = (SELECT MAX(score) FROM learning_history h WHERE h.user_id = users.user_id),
+                last_score = (SELECT score FROM learning_history h WHERE h.user_id = users.user_id
+                              ORDER BY ts DESC, id DESC LIMIT 1),
+                last_ts = (SELECT MAX(ts) FROM learning_history h WHERE h.user_id = users.user_id)
+        """)
+    conn.execute('DROP INDEX IF EXISTS learning_history_user')
+    # Окно «последние 7 дней» читается диапазоном по этому индексу
+    conn.execute('CREATE INDEX IF NOT EXISTS learning_history_user_ts ON learning_history (user_id, ts)')
+
+
+def _row_to_user(user_id, row):
+    """Сборка словаря пользователя из строки таблицы
+
+    История отдаётся только агрегатами (без массивов), как history.summary()
+    """
+    phone, level, level_math, score_math, extra, *aggregates = row
+    user = pickle.loads(extra) if extra else {}
+    for name, value in zip(COLUMNS, (phone, level, level_math, score_math)):
+        if value is not None:
+            user[name] = value
+    if aggregates[0]:
+        user['history'] = dict(zip(AGGREGATES.values(), aggregates))
+    return user
+
+
+def _set_history(conn, user_id, value):
+    """Замена всей истории пользователя"""
+    if isinstance(value, list):  # Старый формат: список {'score', 'date'}
+        value = history.from_entries(value)
+    conn.execute('DELETE FROM learning_history WHERE user_id = ?', (user_id,))
+    if 'ts' in value:
+        conn.executemany(SQL_RESULT_APPEND, ((user_id, ts, score) for ts, score in zip(value['ts'], value['scores'])))
+    conn.execute(SQL_SET_AGGREGATES, (value['attempts'], value['sum'], value['best'],
+                                      value['last'], value['last_ts'], user_id))
+
+
+def _set_fields(conn, user_id, fields):
+    """Запись полей пользователя внутри открытой транзакции"""
+    conn.execute(SQL_INSERT, (user_id,))
+    extra_fields = {}
+    for name, value in fields.items():
+        if name in SQL_SET_FIELD:
+            conn.execute(SQL_SET_FIELD[name], (value, user_id))
+        elif name in ('history', 'learning_history'):
+            _set_history(conn, user_id, value)
+        else:
+            extra_fields[name] = value
+    if extra_fields:
+        row = conn.execute(SQL_GET_EXTRA, (user_id,)).fetchone()
+        extra = pickle.loads(row[0]) if row[0] else {}
+        extra.update(extra_fields)
+        conn.execute(SQL_SET_EXTRA, (pickle.dumps(extra), user_id))
+
+
+# === Интерфейс хранилища (как у user_journal) ===
+
+def start():
+    """Создание схемы базы"""
+    conn = _conn()
+    conn.executescript(SCHEMA)
+    with conn:
+        _migrate(conn)
+
+
+def is_registered(user_id):
+    """Проверка наличия пользователя"""
+    return _conn().execute(SQL_EXISTS, (str(user_id),)).fetchone() is not None
+
+
+def get_user(user_id):
+    """Данные пользователя или None"""
+    conn = _conn()
+    row = conn.execute(SQL_GET, (str(user_id),)).fetchone()
+    return _row_to_user(str(user_id), row) if row else None
+
+
+def get_field(user_id, key, default=None):
+    """Значение одного поля пользователя"""
+    if key in SQL_GET_FIELD:
+        row = _conn().execute(SQL_GET_FIELD[key], (str(user_id),)).fetchone()
+        return row[0] if row and row[0] is not None else default
+    user = get_user(user_id)
+    return user.get(key, default) if user else default
+
+
+def set_fields(user_id, **fields):
+    """Установка полей пользователя (запись создаётся при необходимости)"""
+    conn = _conn()
+    with conn:  # Одна транзакция на все поля
+        _set_fields(conn, str(user_id), fields)
+
+
+def append(user_id, key, item):
+    """Добавление элемента в списочное поле пользователя"""
+    update(user_id, {}, [(key, item, None)])
+
+
+@contextmanager
+def begin(user_id):
+    """Атомарный участок транзакции: текущие данные пользователя или None
+
+    BEGIN IMMEDIATE сразу берёт блокировку записи, поэтому чтение и
+    запись транзакции не перемешиваются и с другими процессами бота
+    """
+    conn = _conn()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield get_user(user_id)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def update(user_id, fields, appends):
+    """Запись результата транзакции"""
+    conn = _conn()
+    if conn.in_transaction:  # Внутри begin() фиксирует сам begin()
+        _update(conn, str(user_id), fields, appends)
+    else:
+        with conn:
+            _update(conn, str(user_id), fields, appends)
+
+
+def _update(conn, user_id, fields, appends):
+    """Запись полей и добавленных элементов списков"""
+    _set_fields(conn, user_id, fields)
+    for key, item, _ in appends:
+        row = conn.execute(SQL_GET_EXTRA, (user_id,)).fetchone()
+        extra = pickle.loads(row[0]) if row and row[0] else {}
+        extra.setdefault(key, []).append(item)
+        conn.execute(SQL_SET_EXTRA, (pickle.dumps(extra), user_id))
+
+
+def add_result(user_id, score, ts=None):
+    """Добавление результата теста; False, если пользователь не найден"""
+    conn = _conn()
+    user_id = str(user_id)
+    ts = int(time.time() if ts is None else ts)
+    with conn:
+        if conn.execute(SQL_EXISTS, (user_id,)).fetchone() is None:
+            return False
+        conn.execute(SQL_RESULT_APPEND, (user_id, ts, float(score)))
+        conn.execute(SQL_RESULT_AGGREGATE, {'score': float(score), 'ts': ts, 'user_id': user_id})
+    return True
+
+
+def history_stats(user_id, now=None):
+    """Сводка по истории: агрегаты из строки пользователя и окно по индексу"""
+    conn = _conn()
+    now = time.time() if now is None else now
+    row = conn.execute(SQL_AGGREGATES, (str(user_id),)).fetchone()
+    result = history.summary(dict(zip(AGGREGATES.values(), row)) if row else None)
+    week_attempts, week_mean = conn.execute(SQL_WEEK, (str(user_id), int(now - history.WEEK))).fetchone()
+    result['week_attempts'] = week_attempts
+    result['week_mean'] = week_mean
+    return result
+
+
+def all_users():
+    """Данные всех пользователей"""
+    conn = _conn()
+    users = {}
+    for user_id, *row in conn.execute(SQL_ALL).fetchall():
+        users[user_id] = _row_to_user(user_id, row)
+    return users
+
+
+def iter_users():
+    """Перебор пользователей по одному через курсор, без fetchall"""
+    conn = _conn()
+    for user_id, *row in conn.execute(SQL_ALL):
+        yield user_id, _row_to_user(user_id, row)
+
+
+def page_users(offset, limit):
+    """Страница пользователей в порядке user_id"""
+    conn = _conn()
+    rows = conn.execute(SQL_PAGE, (limit, offset)).fetchall()
+    return [(user_id, _row_to_user(user_id, row)) for user_id, *row in rows]
+
+
+def count_users():
+    """Количество зарегистрированных пользователей"""
+    return _conn().execute(SQL_COUNT).fetchone()[0]
+
+
+def clear():
+    """Удаление всех пользователей"""
+    conn = _conn()
+    with conn:
+        conn.execute('DELETE FROM learning_history')
+        conn.execute('DELETE FROM users')
+
+
+def is_imported(marker):
+    """Был ли уже импорт с этим marker"""
+    return _conn().execute('SELECT 1 FROM meta WHERE key = ?', (marker,)).fetchone() is not None
+
+
+def import_users(users, marker):
+    """Однократный импорт словаря пользователей, повтор с тем же marker пропускается"""
+    conn = _conn()
+    with conn:
+        if conn.execute('SELECT 1 FROM meta WHERE key = ?', (marker,)).fetchone():
+            return False
+        for user_id, fields in users.items():
+            _set_fields(conn, str(user_id), fields)
+        conn.execute('INSERT INTO meta (key, value) VALUES (?, ?)', (marker, str(len(users))))
+    return True
+
+
+def close():
+    """Закрытие соединения текущего потока"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
@@ -0,0 +1,310 @@
+# Хранилище пользователей в памяти с журналом изменений
+# Записи живут в памяти, каждое изменение дописывается в журнал,
+# а фоновый поток периодически сворачивает журнал в снимок user_data.pkl
+import os  # Для работы с файловой системой
+import pickle  # Для сериализации снимка и записей журнала
+import threading  # Для блокировок и фонового потока сжатия
+import copy  # Для выдачи копий записей наружу
+import shutil  # Для склейки журналов
+import time  # Текущее время для истории
+import history  # Компактная история результатов
+from contextlib import contextmanager  # Для транзакций
+
+SNAPSHOT_FILE = 'user_data.pkl'  # Снимок всех пользователей (формат прежний: {user_id: dict})
+JOURNAL_FILE = 'user_data.journal'  # Журнал изменений после последнего снимка
+COMPACT_INTERVAL = 30  # Период фонового сжатия, секунд
+COMPACT_MIN_RECORDS = 1  # Минимум записей в журнале для сжатия
+
+_users = {}  # {user_id: данные пользователя}
+_lock = threading.RLock()  # Защищает _users и файл журнала
+_compact_lock = threading.Lock()  # Не даёт двум сжатиям идти одновременно
+_loaded = False  # Загружены ли данные с диска
+_journal = None  # Открытый на дозапись файл журнала
+_journal_records = 0  # Количество записей в текущем журнале
+_compactor = None  # Фоновый поток сжатия
+_stop = threading.Event()  # Сигнал остановки фонового потока
+
+
+# === Применение операций ===
+# Операции журнала:
+#   ('set', user_id, {поле: значение})  - установка полей
+#   ('append', user_id, поле, элемент, индекс) - добавление в список
+#   ('update', user_id, {поле: значение}, [(поле, элемент, индекс), ...])
+#       - результат транзакции, применяется целиком
+#   ('result', user_id, время, результат, индекс) - результат теста в историю
+#   ('clear',) - удаление всех пользователей
+# Повторное применение операции не меняет результат, поэтому журнал,
+# уже вошедший в снимок, можно безопасно проиграть ещё раз
+
+def _apply(op):
+    """Применение одной операции журнала к данным в памяти"""
+    kind = op[0]
+    if kind == 'set':
+        _, user_id, fields = op
+        _users.setdefault(user_id, {}).update(fields)
+    elif kind == 'append':
+        _, user_id, key, item, index = op
+        items = _users.setdefault(user_id, {}).setdefault(key, [])
+        if len(items) == index:  # Пропускаем уже применённое добавление
+            items.append(item)
+    elif kind == 'update':
+        _, user_id, fields, appends = op
+        _apply(('set', user_id, fields))
+        for key, item, index in appends:
+            _apply(('append', user_id, key, item, index))
+    elif kind == 'result':
+        _, user_id, ts, score, index = op
+        hist = _users.setdefault(user_id, {}).setdefault('history', history.new())
+        if hist['attempts'] == index:  # Пропускаем уже применённый результат
+            history.add(hist, ts, score)
+    elif kind == 'clear':
+        _users.clear()
+
+
+def _convert_history():
+    """Перевод старых списков learning_history в компактную историю;
+    True, если что-то переведено"""
+    changed = False
+    for user in _users.values():
+        if 'learning_history' not in user:
+            continue
+        entries = user.pop('learning_history')
+        changed = True
+        if entries:
+            hist = user.setdefault('history', history.new())
+            converted = history.from_entries(entries)
+            for ts, score in zip(converted['ts'], converted['scores']):
+                history.add(hist, ts, score)
+    return changed
+
+
+def _read_journal(path):
+    """Чтение записей журнала; оборванная последняя запись отрезается"""
+    ops = []
+    if not os.path.exists(path):
+        return ops
+    with open(path, 'r+b') as f:
+        good = 0  # Конец последней целой записи
+        while True:
+            try:
+                ops.append(pickle.load(f))
+                good = f.tell()
+            except EOFError:
+                break
+            except (pickle.UnpicklingError, ValueError, TypeError, AttributeError, IndexError):
+                break
+        # Обрезаем хвост, иначе новые записи окажутся после мусора
+        if os.fstat(f.fileno()).st_size > good:
+            print(f"Журнал {path} обрывается, хвост отрезан")
+            f.truncate(good)
+    return ops
+
+
+def _load():
+    """Загрузка снимка и проигрывание журналов"""
+    global _loaded, _journal, _journal_records
+    if _loaded:
+        return
+    if os.path.exists(SNAPSHOT_FILE):
+        with open(SNAPSHOT_FILE, 'rb') as f:
+            _users.update(pickle.load(f))
+    # Журнал, оставшийся от прерванного сжатия, идёт раньше текущего
+    _journal_records = 0
+    for path in (JOURNAL_FILE + '.old', JOURNAL_FILE):
+        for op in _read_journal(path):
+            _apply(op)
+            _journal_records += 1  # Проигранные записи тоже ждут сжатия
+    converted = _convert_history()
+    _journal = open(JOURNAL_FILE, 'ab')
+    _loaded = True
+    if converted:
+        # Перевод в журнал не пишется: без нового снимка результаты, записанные
+        # после него (с индексом от переведённой истории), при проигрывании
+        # журнала легли бы на пустую историю и были бы отброшены. Фоновое
+        # сжатие ещё не запущено - первая загрузка идёт в start()
+        _compact(force=True)
+
+
+def _log(op):
+    """Применение операции и запись её в журнал"""
+    global _journal_records
+    _load()
+    _apply(op)
+    pickle.dump(op, _journal)
+    _journal.flush()  # Отдаём запись ОС, fsync делается при сжатии
+    _journal_records += 1
+
+
+# === Публичный интерфейс ===
+
+def is_registered(user_id):
+    """Проверка наличия пользователя"""
+    with _lock:
+        _load()
+        return str(user_id) in _users
+
+
+def get_user(user_id):
+    """Копия данных пользователя или None"""
+    with _lock:
+        _load()
+        user = _users.get(str(user_id))
+        return copy.deepcopy(user) if user is not None else None
+
+
+def get_field(user_id, key, default=None):
+    """Значение одного поля пользователя"""
+    with _lock:
+        _load()
+        return copy.deepcopy(_users.get(str(user_id), {}).get(key, default))
+
+
+def set_fields(user_id, **fields):
+    """Установка полей пользователя (запись создаётся при необходимости)"""
+    with _lock:
+        _log(('set', str(user_id), copy.deepcopy(fields)))
+
+
+def append(user_id, key, item):
+    """Добавление элемента в списочное поле пользователя"""
+    with _lock:
+        _load()
+        index = len(_users.get(str(user_id), {}).get(key, []))
+        _log(('append', str(user_id), key, copy.deepcopy(item), index))
+
+
+@contextmanager
+def begin(user_id):
+    """Атомарный участок транзакции: текущие данные пользователя или None
+
+    Запись транзакции уходит в журнал одной операцией update, поэтому
+    при сбое она либо применяется целиком, либо отбрасывается с хвостом
+    """
+    yield get_user(user_id)
+
+
+def update(user_id, fields, appends):
+    """Запись результата транзакции одной операцией журнала"""
+    with _lock:
+        _load()
+        _log(('update', str(user_id), copy.deepcopy(fields), copy.deepcopy(appends)))
+
+
+def add_result(user_id, score, ts=None):
+    """Добавление результата теста; False, если пользователь не найден"""
+    with _lock:
+        _load()
+        user = _users.get(str(user_id))
+        if user is None:
+            return False
+        index = user['history']['attempts'] if 'history' in user else 0
+        _log(('result', str(user_id), int(time.time() if ts is None else ts), float(score), index))
+        return True
+
+
+def history_stats(user_id, now=None):
+    """Сводка по истории без копирования массивов"""
+    with _lock:
+        _load()
+        return history.stats(_users.get(str(user_id), {}).get('history'), now)
+
+
+def all_users():
+    """Копия данных всех пользователей"""
+    with _lock:
+        _load()
+        return copy.deepcopy(_users)
+
+
+def iter_users():
+    """Перебор пользователей по одному, без копии всех данных сразу"""
+    with _lock:
+        _load()
+        user_ids = sorted(_users)
+    for user_id in user_ids:
+        user = get_user(user_id)
+        if user is not None:  # Пользователь мог быть удалён во время обхода
+            yield user_id, user
+
+
+def page_users(offset, limit):
+    """Страница пользователей в порядке user_id"""
+    with _lock:
+        _load()
+        user_ids = sorted(_users)[offset:offset + limit]
+        return [(user_id, copy.deepcopy(_users[user_id])) for user_id in user_ids]
+
+
+def count_users():
+    """Количество зарегистрированных пользователей"""
+    with _lock:
+        _load()
+        return len(_users)
+
+
+def clear():
+    """Удаление всех пользователей"""
+    with _lock:
+        _log(('clear',))
+    compact()
+
+
+def compact():
+    """Сворачивание журнала в снимок"""
+    with _compact_lock:
+        _compact()
+
+
+def _compact(force=False):
+    global _journal, _journal_records
+    old_journal = JOURNAL_FILE + '.old'
+    with _lock:
+        _load()
+        if not force and _journal_records == 0 and os.path.exists(SNAPSHOT_FILE):
+            return
+        # Под блокировкой только сериализуем данные и переключаем журнал
+        data = pickle.dumps(_users)
+        _journal.close()
+        if os.path.exists(old_journal):
+            # Прошлое сжатие не завершилось - дописываем журнал к старому
+            with open(old_journal, 'ab') as dst, open(JOURNAL_FILE, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+            os.remove(JOURNAL_FILE)
+        else:
+            os.replace(JOURNAL_FILE, old_journal)
+        _journal = open(JOURNAL_FILE, 'ab')
+        _journal_records = 0
+    # Запись снимка идёт без блокировки, обработчики продолжают работать
+    tmp = SNAPSHOT_FILE + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, SNAPSHOT_FILE)
+    os.remove(old_journal)
+
+
+def _compact_loop():
+    """Фоновое сжатие журнала"""
+    while not _stop.wait(COMPACT_INTERVAL):
+        if _journal_records >= COMPACT_MIN_RECORDS:
+            try:
+                compact()
+            except Exception as e:
+                print(f"Ошибка сжатия журнала: {e}")
+
+
+def start():
+    """Загрузка данных и запуск фонового потока сжатия"""
+    global _compactor
+    with _lock:
+        _load()
+        if _compactor is None:
+            _compactor = threading.Thread(target=_compact_loop, daemon=True)
+            _compactor.start()
+
+
+def close():
+    """Остановка фонового потока и финальное сжатие"""
+    _stop.set()
+    compact()
@@ -0,0 +1,156 @@
+# Общее хранилище данных пользователей
+# Обработчики работают только с этим модулем, а он передаёт вызовы
+# выбранному в config.py хранилищу: user_journal (память + журнал)
+# или user_db (SQLite)
+import os  # Для проверки наличия старого файла данных
+import copy  # Для рабочей копии записи в транзакции
+import threading  # Для блокировок пользователей
+from contextlib import contextmanager  # Для транзакций
+import config  # Настройки хранилища
+import user_journal  # Хранилище в памяти с журналом
+import user_db  # Хранилище в SQLite
+
+_backend = user_journal  # Текущее хранилище
+
+# Полосы блокировок: пользователь всегда попадает в одну и ту же полосу,
+# разные пользователи почти всегда в разные, поэтому обработчики
+# разных учеников не ждут друг друга
+LOCK_STRIPES = 64
+_stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def _stripe(user_id):
+    """Блокировка полосы пользователя"""
+    return _stripes[hash(str(user_id)) % LOCK_STRIPES]
+
+
+def init():
+    """Выбор хранилища по настройкам и его запуск"""
+    global _backend
+    if getattr(config, 'user_backend', 'journal') == 'sqlite':
+        user_db.DB_FILE = getattr(config, 'user_db_file', user_db.DB_FILE)
+        _backend = user_db
+        _backend.start()
+        _migrate_to_db()
+    else:
+        _backend = user_journal
+        _backend.start()
+
+
+def _migrate_to_db():
+    """Однократный перенос пользователей из user_data.pkl в SQLite"""
+    # Метка проверяется раньше: после переноса старый файл не читается
+    if not os.path.exists(user_journal.SNAPSHOT_FILE) or user_db.is_imported('migrated_from_pkl'):
+        return
+    # Журнал тоже учитывается: данные берём через user_journal
+    users = user_journal.all_users()
+    if user_db.import_users(users, 'migrated_from_pkl'):
+        print(f"Перенесено пользователей в SQLite: {len(users)}")
+
+
+def is_registered(user_id):
+    """Проверка наличия пользователя"""
+    return _backend.is_registered(user_id)
+
+
+def get_user(user_id):
+    """Данные пользователя или None"""
+    return _backend.get_user(user_id)
+
+
+def get_field(user_id, key, default=None):
+    """Значение одного поля пользователя"""
+    return _backend.get_field(user_id, key, default)
+
+
+def set_fields(user_id, **fields):
+    """Установка полей пользователя"""
+    with _stripe(user_id):
+        _backend.set_fields(user_id, **fields)
+
+
+def append(user_id, key, item):
+    """Добавление элемента в списочное поле пользователя"""
+    with _stripe(user_id):
+        _backend.append(user_id, key, item)
+
+
+@contextmanager
+def transaction(user_id):
+    """Транзакция над данными одного пользователя
+
+    Выдаёт рабочую копию записи ({} для нового пользователя). Если блок
+    завершился без исключения, изменения записываются одной операцией:
+    изменённые поля целиком, а дописанные в конец списков элементы -
+    добавлением. Удаление полей не поддерживается.
+
+        with user_store.transaction(user_id) as user:
+            user['score_math'] += 1
+    """
+    with _stripe(user_id):
+        with _backend.begin(user_id) as before:
+            before = before or {}
+            user = copy.deepcopy(before)
+            yield user
+            fields, appends = _diff(before, user)
+            if fields or appends:
+                _backend.update(user_id, fields, appends)
+
+
+def _diff(before, after):
+    """Изменённые поля и элементы, дописанные в конец списков"""
+    fields = {}
+    appends = []
+    for key, value in after.items():
+        old = before.get(key)
+        if key in before and value == old:
+            continue
+        if isinstance(old, list) and isinstance(value, list) and value[:len(old)] == old:
+            appends.extend((key, item, len(old) + i) for i, item in enumerate(value[len(old):]))
+        else:
+            fields[key] = value
+    return fields, appends
+
+
+def add_result(user_id, score, ts=None):
+    """Запись результата теста в историю; False, если пользователь не найден"""
+    with _stripe(user_id):
+        return _backend.add_result(user_id, score, ts)
+
+
+def history_stats(user_id, now=None):
+    """Сводка по истории тестов пользователя
+
+    {'attempts', 'mean', 'best', 'last', 'last_ts', 'week_attempts', 'week_mean'}
+    """
+    return _backend.history_stats(user_id, now)
+
+
+def all_users():
+    """Данные всех пользователей"""
+    return _backend.all_users()
+
+
+def iter_users():
+    """Перебор пар (user_id, данные) по одному пользователю"""
+    return _backend.iter_users()
+
+
+def page_users(offset, limit):
+    """Страница пользователей: список пар (user_id, данные)"""
+    return _backend.page_users(offset, limit)
+
+
+def count_users():
+    """Количество зарегистрированных пользователей"""
+    return _backend.count_users()
+
+
+def clear():
+    """Удаление всех пользователей"""
+    _backend.clear()
+
+
+def close():
+    """Сохранение данных перед остановкой"""
+    _backend.close()
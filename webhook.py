@@ -0,0 +1,103 @@
+# Приём обновлений Telegram через webhook
+# Встроенный HTTP-сервер проверяет секретный токен (без секрета сервер
+# не запускается), кладёт обновление
+# в ограниченную очередь и сразу отвечает 200, а обработка идёт
+# в отдельном потоке
+import hmac  # Сравнение секрета за постоянное время
+import json  # Разбор тела запроса
+import queue  # Ограниченная очередь обновлений
+import secrets  # Случайный секрет, если он не задан
+import ssl  # Необязательный HTTPS без обратного прокси
+import threading  # Поток обработки очереди
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Встроенный HTTP-сервер
+from telebot import types  # Разбор обновлений
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'  # Заголовок с секретом от Telegram
+MAX_BODY = 1024 * 1024  # Больше обновление весить не может
+
+
+def make_handler(updates, secret, path):
+    """Класс обработчика HTTP-запросов для очереди updates"""
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != path:
+                return self._reply(404)
+            # Запросы без верного секрета приходят не от Telegram
+            if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ''), secret):
+                return self._reply(403)
+            length = int(self.headers.get('Content-Length') or 0)
+            if length <= 0 or length > MAX_BODY:
+                return self._reply(400)
+            body = self.rfile.read(length)
+            try:
+                updates.put_nowait(body)
+            except queue.Full:
+                # Telegram повторит доставку позже
+                return self._reply(503)
+            self._reply(200)
+
+        def do_GET(self):
+            self._reply(405)
+
+        def _reply(self, code):
+            self.send_response(code)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass  # Не печатаем строку на каждое обновление
+
+    return WebhookHandler
+
+
+def process_updates(bot, updates):
+    """Обработка очереди обновлений (выполняется в отдельном потоке)"""
+    while True:
+        body = updates.get()
+        try:
+            update = types.Update.de_json(json.loads(body.decode('utf-8')))
+            bot.process_new_updates([update])
+        except Exception as e:
+            print(f"Ошибка обработки обновления: {e}")
+        finally:
+            updates.task_done()
+
+
+def start_webhook_server(bot, listen='0.0.0.0', port=8443, path='/webhook', secret='',
+                         queue_size=1000, ssl_cert=None, ssl_key=None):
+    """Запуск HTTP-сервера и потока обработки, возвращает сервер"""
+    if not secret:
+        raise ValueError('Webhook без секрета принимал бы обновления от кого угодно: задайте webhook_secret')
+    updates = queue.Queue(maxsize=queue_size)
+    server = ThreadingHTTPServer((listen, port), make_handler(updates, secret, path))
+    if ssl_cert:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(ssl_cert, ssl_key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    server.updates = updates  # Очередь доступна для отладки и метрик
+    threading.Thread(target=process_updates, args=(bot, updates), daemon=True).start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_webhook(bot, url, listen='0.0.0.0', port=8443, path='/webhook', secret='',
+                queue_size=1000, ssl_cert=None, ssl_key=None):
+    """Регистрация webhook в Telegram и приём обновлений до остановки"""
+    if not secret and url:
+        # Секрет не задан - придумываем свой и сообщаем его Telegram при
+        # регистрации webhook (без url сообщить его некому)
+        secret = secrets.token_urlsafe(32)
+    server = start_webhook_server(bot, listen, port, path, secret, queue_size, ssl_cert, ssl_key)
+    if url:
+        # Сертификат нужен Telegram только если он самоподписанный
+        if ssl_cert:
+            with open(ssl_cert, 'rb') as certificate:
+                bot.set_webhook(url=url.rstrip('/') + path, secret_token=secret, certificate=certificate)
+        else:
+            bot.set_webhook(url=url.rstrip('/') + path, secret_token=secret)
+    print(f"Webhook слушает {listen}:{port}{path}")
+    try:
+        threading.Event().wait()  # Работаем до прерывания
+    except KeyboardInterrupt:
+        server.shutdown()